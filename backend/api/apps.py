@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals, loyalty  # noqa: F401
+        from django.core.signals import request_started
+        from .prefix_index import WARM_UP_UID, warm_prefix_indexes
+
+        request_started.connect(warm_prefix_indexes, dispatch_uid=WARM_UP_UID)
@@ -0,0 +1,92 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import CustomUser
+
+VERSION_KEY = 'catalog:version'
+
+
+def _admin_key(user_id):
+    return f'catalog:admin:{user_id}'
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock rather than 1 so a cache flush can never hand
+        # out a version (and therefore an ETag) that was already issued.
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+        return cache.incr(VERSION_KEY)
+
+
+def catalog_changed():
+    # Bump only once the write is visible to other requests, otherwise a
+    # concurrent reader could cache the old rows under the new version.
+    transaction.on_commit(bump_catalog_version)
+
+
+def is_catalog_admin(user_id):
+    """
+    Whether the user may see admin-only catalog fields, read from the user
+    row. The answer is cached for CATALOG_ADMIN_CACHE_TIMEOUT seconds and
+    dropped when the user is saved, so a demoted admin loses access quickly.
+    """
+    key = _admin_key(user_id)
+    is_admin = cache.get(key)
+    if is_admin is None:
+        is_admin = CustomUser.objects.filter(id=user_id).filter(
+            Q(is_staff=True) | Q(is_superuser=True)
+        ).exists()
+        cache.set(key, is_admin, settings.CATALOG_ADMIN_CACHE_TIMEOUT)
+    return is_admin
+
+
+def forget_catalog_admin(user_id):
+    cache.delete(_admin_key(user_id))
+
+
+def _apply_cache_headers(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = f"max-age={settings.CATALOG_CACHE_MAX_AGE}, must-revalidate"
+    # Admins get purchase prices, so the representation depends on the session cookie.
+    response['Vary'] = 'Cookie'
+    return response
+
+
+def cached_catalog_response(request, name, build):
+    """
+    Serve `build()` from the catalog snapshot cache.
+
+    Entries are keyed by the catalog version, so any write to a product,
+    variant or image makes every cached snapshot unreachable at once.
+    """
+    version = get_catalog_version()
+    key_digest = hashlib.md5(f"{name}:{request.get_full_path()}".encode()).hexdigest()[:16]
+    etag = f'"{version}-{key_digest}"'
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return _apply_cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+    cache_key = f"catalog:{version}:{key_digest}"
+    data = cache.get(cache_key)
+    if data is None:
+        data = build()
+        cache.set(cache_key, data, settings.CATALOG_CACHE_TIMEOUT)
+    return _apply_cache_headers(Response(data, status=status.HTTP_200_OK), etag)
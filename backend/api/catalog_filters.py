@@ -0,0 +1,94 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, Max, Min, OuterRef
+from rest_framework.exceptions import ValidationError
+
+from .catalog_cache import get_catalog_version
+from .models import Product, ProductVariant
+
+FILTER_PARAMS = ('category', 'color', 'size', 'min_price', 'max_price', 'in_stock')
+
+
+def _list_param(params, name):
+    return [value.strip() for value in params.get(name, '').split(',') if value.strip()]
+
+
+def _price_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: "A valid number is required."})
+
+
+def filter_products(queryset, params):
+    """
+    Narrow a Product queryset by ?category=, ?color=, ?size= (comma separated,
+    exact values as returned by the facets), ?min_price=, ?max_price= and
+    ?in_stock=1. Color, size and stock must all hold for the same variant.
+    """
+    categories = _list_param(params, 'category')
+    if categories:
+        queryset = queryset.filter(category__in=categories)
+
+    min_price = _price_param(params, 'min_price')
+    if min_price is not None:
+        queryset = queryset.filter(sale_price__gte=min_price)
+    max_price = _price_param(params, 'max_price')
+    if max_price is not None:
+        queryset = queryset.filter(sale_price__lte=max_price)
+
+    colors = _list_param(params, 'color')
+    sizes = _list_param(params, 'size')
+    in_stock = params.get('in_stock', '').lower() in ('1', 'true', 'yes')
+    if colors or sizes or in_stock:
+        variants = ProductVariant.objects.filter(product=OuterRef('pk'))
+        if colors:
+            variants = variants.filter(color__in=colors)
+        if sizes:
+            variants = variants.filter(size__in=sizes)
+        if in_stock:
+            variants = variants.filter(quantity__gt=0)
+        queryset = queryset.filter(Exists(variants))
+
+    return queryset
+
+
+def is_filtered(params):
+    return any(params.get(name) for name in FILTER_PARAMS)
+
+
+def _counts(queryset, field, count_field):
+    rows = (
+        queryset.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+        .values(field).annotate(count=Count(count_field, distinct=True)).order_by(field)
+    )
+    return [{'value': row[field], 'count': row['count']} for row in rows]
+
+
+def compute_facets():
+    prices = Product.objects.aggregate(min=Min('sale_price'), max=Max('sale_price'))
+    return {
+        'categories': _counts(Product.objects.all(), 'category', 'id'),
+        'colors': _counts(ProductVariant.objects.all(), 'color', 'product'),
+        'sizes': _counts(ProductVariant.objects.all(), 'size', 'product'),
+        'in_stock': ProductVariant.objects.filter(quantity__gt=0).values('product').distinct().count(),
+        'price': {
+            'min': float(prices['min']) if prices['min'] is not None else None,
+            'max': float(prices['max']) if prices['max'] is not None else None,
+        },
+    }
+
+
+def catalog_facets():
+    """Products per category/color/size, computed once per catalog version."""
+    key = f"catalog:{get_catalog_version()}:facets"
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets()
+        cache.set(key, facets, settings.CATALOG_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,90 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Order, OrderItem
+
+ORDER_COLUMNS = [
+    'order_id', 'created_at', 'status', 'user_id', 'email', 'full_name', 'phone', 'governorate', 'address',
+    'coupon_code', 'cart_total', 'delivery_fee', 'total_price',
+]
+ITEM_COLUMNS = ['product', 'color', 'size', 'quantity', 'sale_price', 'purchase_price']
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def export_queryset(queryset):
+    """Orders with their items, user and products loaded per chunk rather than per row."""
+    items = OrderItem.objects.select_related('product_variant__product').order_by('id')
+    return (
+        queryset.select_related('user')
+        .prefetch_related(Prefetch('items', queryset=items))
+        .order_by('created_at', 'id')
+    )
+
+
+def _order_fields(order):
+    shipping = order.shipping_info or {}
+    return {
+        'order_id': order.id,
+        'created_at': order.created_at.isoformat(),
+        'status': order.status,
+        'user_id': order.user_id,
+        'email': order.user.email,
+        'full_name': shipping.get('fullName', ''),
+        'phone': shipping.get('phone', ''),
+        'governorate': shipping.get('governorate', ''),
+        'address': shipping.get('address', ''),
+        'coupon_code': order.coupon_code or '',
+        'cart_total': str(order.cart_total),
+        'delivery_fee': str(order.delivery_fee),
+        'total_price': str(order.total_price),
+    }
+
+
+def _item_fields(item):
+    variant = item.product_variant
+    return {
+        'product': variant.product.name,
+        'color': variant.color,
+        'size': variant.size,
+        'quantity': item.quantity,
+        'sale_price': str(item.sale_price),
+        'purchase_price': str(item.purchase_price),
+    }
+
+
+def iter_csv(queryset, chunk_size=500):
+    """One CSV line per order item (orders without items get one line with blank item columns)."""
+    writer = csv.DictWriter(_Echo(), fieldnames=ORDER_COLUMNS + ITEM_COLUMNS)
+    yield writer.writeheader()
+    for order in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        order_fields = _order_fields(order)
+        items = order.items.all()
+        if not items:
+            yield writer.writerow(order_fields)
+        for item in items:
+            yield writer.writerow({**order_fields, **_item_fields(item)})
+
+
+def iter_ndjson(queryset, chunk_size=500):
+    """One JSON object per order, with its items nested."""
+    for order in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        record = _order_fields(order)
+        record['items'] = [_item_fields(item) for item in order.items.all()]
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_orders(queryset, file_format, chunk_size=500):
+    if file_format == 'csv':
+        return iter_csv(queryset, chunk_size)
+    return iter_ndjson(queryset, chunk_size)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def purge_expired_keys():
+    """Delete expired keys. Run periodically by run_outbox_worker, not per request."""
+    return IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()[0]
+
+
+def claim_idempotency_key(request, key):
+    """
+    Reserve `key` for this request.
+
+    Returns (record, None) when the request should run, or (None, response)
+    when it must not: the stored response of the original request, 409
+    while that request is still in flight, or 422 if the key was used for a
+    different payload.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return None, Response(
+            {"message": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    fingerprint = request_fingerprint(request)
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=request.user, key=key, fingerprint=fingerprint,
+                expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+            )
+        return record, None
+    except IntegrityError:
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is None:
+            return claim_idempotency_key(request, key)
+        if record.expires_at <= now:
+            # Not purged yet (see purge_expired_keys); an expired key is free to reuse.
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            return claim_idempotency_key(request, key)
+
+    if record.fingerprint != fingerprint:
+        return None, Response(
+            {"message": "This Idempotency-Key was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record.status_code is None:
+        stale = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        taken_over = IdempotencyKey.objects.filter(
+            pk=record.pk, status_code__isnull=True, created_at__lt=stale
+        ).update(created_at=now)
+        if taken_over:
+            return record, None
+        return None, Response(
+            {"message": "A request with this Idempotency-Key is still being processed."},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    response = Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return None, response
+
+
+def store_response(record, status_code, body):
+    """Save the outcome; call inside the transaction that made the writes."""
+    record.status_code = status_code
+    # Stored as rendered, so a replay returns the same JSON the client saw.
+    record.response_body = json.loads(JSONRenderer().render(body))
+    record.save(update_fields=['status_code', 'response_body'])
+
+
+def release_idempotency_key(record):
+    """
+    Forget a key whose request failed. Failed requests roll back all their
+    writes, so letting the retry run again is safe and lets it succeed
+    once the cause (e.g. stock) is fixed.
+    """
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
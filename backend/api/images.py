@@ -0,0 +1,153 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .catalog_cache import bump_catalog_version
+from .models import ProductImage
+
+logger = logging.getLogger(__name__)
+
+# name -> maximum width in pixels
+DERIVATIVE_SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1200,
+}
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+DERIVATIVE_DIR = 'products/derivatives'
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                thread_name_prefix='image-derivatives'
+            )
+        return _executor
+
+
+def _encode(image, fmt):
+    pil_format, options = DERIVATIVE_FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        if image.mode in ('RGBA', 'LA'):
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(product_image):
+    """
+    Render every size/format pair for one ProductImage and record them.
+
+    Output names are derived from the original's content hash, so identical
+    uploads share one set of files and existing files are not re-rendered.
+    """
+    stem = product_image.content_hash or f"image-{product_image.id}"
+    derivatives = {}
+    with product_image.image.open('rb') as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+
+    for size_name, max_width in DERIVATIVE_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail((max_width, max_width * 4), Image.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+        for fmt in DERIVATIVE_FORMATS:
+            name = f"{DERIVATIVE_DIR}/{stem}_{size_name}.{fmt}"
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(_encode(resized, fmt)))
+            entry[fmt] = name
+        derivatives[size_name] = entry
+    return derivatives
+
+
+def _render(image_id):
+    """Render and store the derivatives of one image; True if they were stored."""
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    if product_image is None or not product_image.image:
+        return False
+    try:
+        derivatives = generate_derivatives(product_image)
+    except Exception as e:
+        # Nothing is stored, so the image stays in missing_derivatives() and is retried.
+        logger.error(f"Failed to generate derivatives for image {image_id}: {str(e)}")
+        return False
+    ProductImage.objects.filter(pk=image_id).update(derivatives=derivatives)
+    return True
+
+
+def render_derivatives(image_ids):
+    """Render a batch of images, bumping the catalog version once for the whole batch."""
+    rendered = sum(_render(image_id) for image_id in image_ids)
+    if rendered:
+        bump_catalog_version()
+    return rendered
+
+
+def missing_derivatives():
+    """Images that have no derivatives yet, including ones whose rendering failed."""
+    return ProductImage.objects.exclude(image='').filter(Q(derivatives={}) | Q(derivatives__has_key='error'))
+
+
+def _process(image_ids):
+    close_old_connections()
+    try:
+        render_derivatives(image_ids)
+    finally:
+        with _executor_lock:
+            _pending.difference_update(image_ids)
+        close_old_connections()
+
+
+def schedule_derivatives(image_ids):
+    """Queue derivative generation for the given images once the current transaction commits."""
+    def submit():
+        with _executor_lock:
+            batch = [image_id for image_id in image_ids if image_id not in _pending]
+            _pending.update(batch)
+        if not batch:
+            return
+        if settings.IMAGE_DERIVATIVE_WORKERS:
+            _get_executor().submit(_process, batch)
+        else:
+            _process(batch)
+
+    transaction.on_commit(submit)
+
+
+def srcset(product_image, request=None):
+    """Map of size -> {width, height, webp, jpeg} URLs, empty until the derivatives exist."""
+    result = {}
+    for size_name, entry in (product_image.derivatives or {}).items():
+        if size_name not in DERIVATIVE_SIZES:
+            continue
+        urls = {
+            fmt: request.build_absolute_uri(default_storage.url(entry[fmt])) if request else default_storage.url(entry[fmt])
+            for fmt in DERIVATIVE_FORMATS if fmt in entry
+        }
+        result[size_name] = {'width': entry.get('width'), 'height': entry.get('height'), **urls}
+    return result
@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .catalog_cache import catalog_changed
+from .models import Product, ProductVariant
+from .prefix_index import product_index, product_payload
+from .search import index_products
+
+CSV_COLUMNS = ['name', 'purchase_price', 'sale_price', 'category', 'color', 'size', 'quantity']
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def iter_jsonl(stream):
+    """Yield (line, record) for a JSONL file with one product per line."""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, RowError({'line': f"Invalid JSON: {e.msg}"})
+            continue
+        if not isinstance(record, dict):
+            yield line_no, RowError({'line': "Each line must be a JSON object."})
+            continue
+        yield line_no, record
+
+
+def iter_csv(stream):
+    """
+    Yield (line, record) for a CSV file with one variant per row.
+
+    Consecutive rows that share a product name are folded into a single
+    product, so the file never has to be held in memory.
+    """
+    reader = csv.DictReader(stream)
+    missing = [c for c in ('name', 'purchase_price', 'sale_price') if c not in (reader.fieldnames or [])]
+    if missing:
+        yield 1, RowError({'columns': f"Missing required columns: {', '.join(missing)}"})
+        return
+
+    current, current_line = None, None
+    for row in reader:
+        line_no = reader.line_num
+        name = (row.get('name') or '').strip()
+        if current is not None and name.lower() != current['name'].lower():
+            yield current_line, current
+            current = None
+        if current is None:
+            current_line = line_no
+            current = {
+                'name': name,
+                'purchase_price': row.get('purchase_price'),
+                'sale_price': row.get('sale_price'),
+                'category': row.get('category') or None,
+                'variants': [],
+            }
+        if row.get('color') or row.get('size'):
+            current['variants'].append({
+                'color': row.get('color'),
+                'size': row.get('size'),
+                'quantity': row.get('quantity') or 0,
+            })
+    if current is not None:
+        yield current_line, current
+
+
+def _decimal(value, field, errors):
+    try:
+        result = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError):
+        errors[field] = "A valid number is required."
+        return None
+    if result <= 0:
+        errors[field] = f"{field.replace('_', ' ').capitalize()} must be greater than zero."
+    return result
+
+
+def validate_record(record):
+    """Return (Product, [ProductVariant]) built from a record, or raise RowError."""
+    errors = {}
+    name = str(record.get('name') or '').strip()
+    max_length = Product._meta.get_field('name').max_length
+    if not name:
+        errors['name'] = "This field is required."
+    elif len(name) > max_length:
+        errors['name'] = f"Ensure this field has no more than {max_length} characters."
+
+    purchase_price = _decimal(record.get('purchase_price'), 'purchase_price', errors)
+    sale_price = _decimal(record.get('sale_price'), 'sale_price', errors)
+    if purchase_price and sale_price and 'sale_price' not in errors and sale_price < purchase_price:
+        errors['sale_price'] = "Sale price must be greater than or equal to purchase price."
+
+    variants_data = record.get('variants') or []
+    if not isinstance(variants_data, list):
+        errors['variants'] = "Expected a list of variants."
+        variants_data = []
+
+    variants, seen = [], set()
+    for i, data in enumerate(variants_data):
+        if not isinstance(data, dict):
+            errors[f'variants[{i}]'] = "Each variant must be an object."
+            continue
+        color = str(data.get('color') or '').strip()
+        size = str(data.get('size') or '').strip()
+        try:
+            quantity = int(data.get('quantity', 0))
+            if quantity < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors[f'variants[{i}]'] = "Quantity must be a non-negative integer."
+            continue
+        if not color or not size:
+            errors[f'variants[{i}]'] = "Color and size are required."
+            continue
+        if (color.lower(), size.lower()) in seen:
+            errors[f'variants[{i}]'] = f"Duplicate variant {color}, {size}."
+            continue
+        seen.add((color.lower(), size.lower()))
+        variants.append(ProductVariant(color=color, size=size, quantity=quantity))
+
+    if errors:
+        raise RowError(errors)
+
+    product = Product(
+        name=name,
+        purchase_price=purchase_price,
+        sale_price=sale_price,
+        category=(str(record['category']).strip() or None) if record.get('category') else None,
+    )
+    return product, variants
+
+
+class ProductImporter:
+    """
+    Load products and variants in batches with bulk_create.
+
+    Each batch is inserted in its own transaction, so a bad row only costs
+    that row: it is reported in `errors` and the rest of the file still
+    loads. Products whose name already exists (case-insensitively) are
+    rejected, since orders look products up by name.
+    """
+
+    def __init__(self, batch_size=500, progress=None):
+        self.batch_size = max(1, int(batch_size))
+        self.progress = progress
+        self.rows = 0
+        self.products_created = 0
+        self.variants_created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def _error(self, line, name, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'name': name, 'errors': errors})
+
+    def _flush(self, batch):
+        names = {product.name.lower() for _, product, _ in batch}
+        existing = set(
+            Product.objects.annotate(lower_name=Lower('name'))
+            .filter(lower_name__in=names)
+            .values_list('lower_name', flat=True)
+        )
+        accepted, seen = [], set()
+        for line, product, variants in batch:
+            key = product.name.lower()
+            if key in existing or key in seen:
+                self._error(line, product.name, {'name': "A product with this name already exists."})
+                continue
+            seen.add(key)
+            accepted.append((product, variants))
+        if not accepted:
+            return
+
+        with transaction.atomic():
+            products = Product.objects.bulk_create([product for product, _ in accepted], batch_size=self.batch_size)
+            new_variants = []
+            for product, (_, variants) in zip(products, accepted):
+                for variant in variants:
+                    variant.product = product
+                    new_variants.append(variant)
+            ProductVariant.objects.bulk_create(new_variants, batch_size=self.batch_size)
+
+            ids = [product.id for product in products]
+            transaction.on_commit(lambda: index_products(ids))
+            for product in products:
+                payload = product_payload(product)
+                transaction.on_commit(
+                    lambda product=product, payload=payload: product_index.upsert(product.id, product.name, payload)
+                )
+            catalog_changed()
+
+        self.products_created += len(products)
+        self.variants_created += len(new_variants)
+
+    def run(self, records):
+        batch = []
+        for line, record in records:
+            self.rows += 1
+            if isinstance(record, RowError):
+                self._error(line, None, record.errors)
+                continue
+            try:
+                product, variants = validate_record(record)
+            except RowError as e:
+                self._error(line, record.get('name'), e.errors)
+                continue
+            batch.append((line, product, variants))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+                self._report()
+        if batch:
+            self._flush(batch)
+        self._report()
+        return self.summary()
+
+    def _report(self):
+        if self.progress:
+            self.progress(self.summary())
+
+    def summary(self):
+        return {
+            'rows': self.rows,
+            'products_created': self.products_created,
+            'variants_created': self.variants_created,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def detect_format(filename, file_format=None):
+    file_format = (file_format or '').lower() or filename.rsplit('.', 1)[-1].lower()
+    if file_format in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if file_format == 'csv':
+        return 'csv'
+    return None
+
+
+def import_products(binary_stream, file_format, batch_size=500, progress=None):
+    stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    records = iter_csv(stream) if file_format == 'csv' else iter_jsonl(stream)
+    return ProductImporter(batch_size=batch_size, progress=progress).run(records)
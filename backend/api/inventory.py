@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from .catalog_cache import catalog_changed
+from .models import ProductVariant
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def apply_stock_deltas(deltas):
+    """
+    Change stock for several variants in one conditional UPDATE.
+
+    `deltas` maps variant id -> units to take (positive) or give back
+    (negative). Takes only apply where `quantity >= n`, so if any variant
+    is short nothing is written and a ValidationError naming the first
+    short variant is raised. Must be called inside a transaction so the
+    caller's other writes roll back with it.
+    """
+    deltas = {variant_id: n for variant_id, n in deltas.items() if n}
+    if not deltas:
+        return
+
+    condition = Q()
+    for variant_id, n in deltas.items():
+        condition |= Q(pk=variant_id, quantity__gte=n) if n > 0 else Q(pk=variant_id)
+    change = Case(
+        *[When(pk=variant_id, then=Value(n)) for variant_id, n in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+    try:
+        with transaction.atomic():
+            updated = ProductVariant.objects.filter(condition).update(
+                quantity=F('quantity') - change, updated_at=timezone.now()
+            )
+            if updated != len(deltas):
+                raise InsufficientStock()
+    except InsufficientStock:
+        variants = ProductVariant.objects.select_related('product').filter(pk__in=deltas)
+        for variant in variants:
+            if variant.quantity < deltas[variant.pk]:
+                raise serializers.ValidationError({
+                    "quantity": f"Out of Stock: Only {variant.quantity} items available for {variant.product.name} ({variant.color}, {variant.size})."
+                })
+        raise serializers.ValidationError({"quantity": "One of the selected products no longer exists."})
+
+    catalog_changed()
@@ -0,0 +1,119 @@
+import logging
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import outbox
+from .models import Coupon, CustomUser
+
+logger = logging.getLogger(__name__)
+
+POINTS_PER_ORDER = 70
+COUPON_THRESHOLD = 500
+COUPON_VALUE = 500
+ORDER_STATUS_CHANGED = 'order.status_changed'
+
+
+COUPON_CODE_ATTEMPTS = 5
+
+
+def new_coupon_codes(count):
+    """
+    `count` distinct OS-XXXXXXXX codes that are not in use yet.
+
+    Gives up after COUPON_CODE_ATTEMPTS rounds instead of spinning inside the
+    caller's transaction if collisions keep happening.
+    """
+    codes = set()
+    for _ in range(COUPON_CODE_ATTEMPTS):
+        if len(codes) >= count:
+            break
+        candidates = {f"OS-{uuid.uuid4().hex[:8].upper()}" for _ in range(count - len(codes))}
+        candidates -= set(Coupon.objects.filter(code__in=candidates).values_list('code', flat=True))
+        codes |= candidates
+    if len(codes) < count:
+        raise RuntimeError(f"Could not generate {count} unused coupon codes.")
+    return list(codes)
+
+
+def apply_points(points, awards=0, deductions=0):
+    """
+    Return (points, coupons) after `awards` deliveries and `deductions`
+    reversals. Each delivery is worth POINTS_PER_ORDER; reaching
+    COUPON_THRESHOLD turns the balance into a coupon and starts again
+    from zero. Reversals never take the balance below zero.
+    """
+    coupons = 0
+    for _ in range(awards):
+        points += POINTS_PER_ORDER
+        if points >= COUPON_THRESHOLD:
+            coupons += 1
+            points = 0
+    points = max(0, points - POINTS_PER_ORDER * deductions)
+    return points, coupons
+
+
+def _points_effect(old_status, new_status, coupon_code):
+    if new_status == 'delivered' and old_status != 'delivered' and not coupon_code:
+        return 1
+    if old_status == 'delivered' and new_status != 'delivered':
+        return -1
+    return 0
+
+
+def publish_status_changes(changes):
+    """
+    Queue the points for a batch of (user_id, old_status, new_status,
+    coupon_code) changes. Call inside the transaction that changes the
+    orders; the outbox worker settles them after it commits.
+    """
+    changes = [list(change) for change in changes if _points_effect(*change[1:])]
+    if changes:
+        outbox.publish(ORDER_STATUS_CHANGED, {'changes': changes})
+
+
+@outbox.handler(ORDER_STATUS_CHANGED)
+def settle_order_status_changes(payload):
+    settle_status_changes(tuple(change) for change in payload['changes'])
+
+
+def settle_status_changes(changes):
+    """
+    Apply loyalty points for a batch of order status changes.
+
+    `changes` is an iterable of (user_id, old_status, new_status, coupon_code).
+    Orders entering 'delivered' without a coupon earn points, orders leaving
+    'delivered' give them back. Users are read once, written with one
+    bulk_update and any earned coupons are inserted with one bulk_create.
+    """
+    awards, deductions = defaultdict(int), defaultdict(int)
+    for user_id, old_status, new_status, coupon_code in changes:
+        effect = _points_effect(old_status, new_status, coupon_code)
+        if effect > 0:
+            awards[user_id] += 1
+        elif effect < 0:
+            deductions[user_id] += 1
+    user_ids = set(awards) | set(deductions)
+    if not user_ids:
+        return
+
+    with transaction.atomic():
+        users = list(CustomUser.objects.select_for_update().filter(id__in=user_ids).only('id', 'points'))
+        coupon_owners = []
+        now = timezone.now()
+        for user in users:
+            user.points, coupons = apply_points(user.points, awards[user.id], deductions[user.id])
+            user.updated_at = now
+            coupon_owners.extend([user] * coupons)
+        CustomUser.objects.bulk_update(users, ['points', 'updated_at'])
+        if coupon_owners:
+            codes = new_coupon_codes(len(coupon_owners))
+            Coupon.objects.bulk_create([
+                Coupon(user=user, code=code, value=COUPON_VALUE) for user, code in zip(coupon_owners, codes)
+            ])
+    logger.info(
+        f"Settled points for {len(users)} users: {sum(awards.values())} awards, "
+        f"{sum(deductions.values())} deductions, {len(coupon_owners)} coupons"
+    )
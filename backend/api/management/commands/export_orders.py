@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from api.exporters import EXPORT_FORMATS, export_orders
+from api.models import Order
+from api.order_filters import filter_orders
+
+
+class Command(BaseCommand):
+    help = 'Stream orders and their items to a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout.")
+        parser.add_argument('--file-format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--date-from', help='First local day to include (YYYY-MM-DD).')
+        parser.add_argument('--date-to', help='Last local day to include (YYYY-MM-DD).')
+        parser.add_argument('--status', help='Comma separated statuses.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        params = {
+            'date_from': options['date_from'] or '',
+            'date_to': options['date_to'] or '',
+            'status': options['status'] or '',
+        }
+        try:
+            orders = filter_orders(Order.objects.all(), params)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        lines = export_orders(orders, options['file_format'], chunk_size=max(1, options['chunk_size']))
+        if options['path'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        try:
+            output = open(options['path'], 'w', encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(str(e))
+        count = 0
+        with output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} lines to {options['path']}."))
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import ProductImage
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f"{directory}/{name}"
+    for name in directories:
+        yield from walk(storage, f"{directory}/{name}")
+
+
+def still_referenced(name):
+    """Re-check one file right before deleting it; rows may have changed since the scan."""
+    return ProductImage.objects.filter(Q(image=name) | Q(derivatives__icontains=name)).exists()
+
+
+class Command(BaseCommand):
+    help = 'Delete product image files (and derivatives) that no ProductImage references anymore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be deleted.')
+        parser.add_argument(
+            '--min-age-hours', type=int, default=24,
+            help='Keep files younger than this, they may belong to an upload that has not committed yet.'
+        )
+
+    def handle(self, *args, **options):
+        storage = ProductImage._meta.get_field('image').storage
+        referenced = set()
+        for name, derivatives in ProductImage.objects.values_list('image', 'derivatives').iterator():
+            if name:
+                referenced.add(name)
+            for entry in (derivatives or {}).values():
+                if isinstance(entry, dict):
+                    referenced.update(v for v in entry.values() if isinstance(v, str))
+
+        if not storage.exists('products'):
+            self.stdout.write('Nothing to collect.')
+            return
+
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+        deleted, freed = 0, 0
+        for name in walk(storage, 'products'):
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                continue
+            if still_referenced(name):
+                continue
+            size = storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(f"would delete {name} ({size} bytes)")
+            else:
+                storage.delete(name)
+            deleted += 1
+            freed += size
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} orphaned files ({freed} bytes)."))
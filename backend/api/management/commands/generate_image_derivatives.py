@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.images import missing_derivatives, render_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Render thumbnails/WebP copies for product images that do not have them yet, retrying failed ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        image_ids = list(missing_derivatives().values_list('id', flat=True))
+        rendered = 0
+        for i in range(0, len(image_ids), batch_size):
+            rendered += render_derivatives(image_ids[i:i + batch_size])
+        failed = len(image_ids) - rendered
+        self.stdout.write(self.style.SUCCESS(f"Rendered derivatives for {rendered} images ({failed} failed)."))
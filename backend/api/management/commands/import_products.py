@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importers import detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = 'Bulk import products and variants from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (one variant per row) or JSONL (one product per line) file.')
+        parser.add_argument('--file-format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        file_format = detect_format(options['path'], options['file_format'])
+        if file_format is None:
+            raise CommandError('Unknown file format, pass --file-format csv or --file-format jsonl.')
+
+        def progress(summary):
+            self.stdout.write(
+                f"rows={summary['rows']} products={summary['products_created']} "
+                f"variants={summary['variants_created']} errors={summary['error_count']}"
+            )
+
+        try:
+            stream = open(options['path'], 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+        with stream:
+            summary = import_products(stream, file_format, batch_size=options['batch_size'], progress=progress)
+
+        for error in summary['errors']:
+            self.stderr.write(f"line {error['line']} ({error['name']}): {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['products_created']} products and {summary['variants_created']} variants "
+            f"with {summary['error_count']} errors."
+        ))
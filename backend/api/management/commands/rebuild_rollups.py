@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily report rollups (Report and ProductDailySales) from the orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='First local day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--date-to', help='Last local day to rebuild (YYYY-MM-DD).')
+
+    def handle(self, *args, **options):
+        days = {}
+        for option in ('date_from', 'date_to'):
+            value = options[option]
+            days[option] = parse_date(value) if value else None
+            if value and days[option] is None:
+                raise CommandError(f"--{option.replace('_', '-')}: Invalid date format. Use YYYY-MM-DD.")
+
+        days, products = rebuild_rollups(first_day=days['date_from'], last_day=days['date_to'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} daily reports and {products} product rows."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import search
+from api.prefix_index import product_index, user_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the full-text product search index from the Product and ProductVariant tables, '
+        'and make the in-memory autocomplete indexes reload.'
+    )
+
+    def handle(self, *args, **options):
+        # Reaches other processes only through a shared cache backend.
+        product_index.invalidate()
+        user_index.invalidate()
+        if not search.fts_available():
+            raise CommandError('The product search index is only available on SQLite with FTS5.')
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products.'))
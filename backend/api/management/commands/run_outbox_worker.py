@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.idempotency import purge_expired_keys
+from api.outbox import drain, purge_processed
+
+# Seconds between clean-ups of old events and expired idempotency keys while idle.
+PURGE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Carry out pending outbox events (points, coupons, ...), retrying failures with backoff. '
+        'Also deletes old processed events and expired idempotency keys.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when nothing is due.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--keep-days', type=int, default=7,
+            help='Delete events that were processed more than this many days ago.'
+        )
+
+    def handle(self, *args, **options):
+        keep = timedelta(days=options['keep_days'])
+        last_purge = None
+        while True:
+            done, failed = drain(batch_size=max(1, options['batch_size']))
+            if done or failed:
+                self.stdout.write(f"processed={done} failed={failed}")
+            if options['once']:
+                purged = purge_processed(keep)
+                keys = purge_expired_keys()
+                self.stdout.write(self.style.SUCCESS(
+                    f"Outbox drained, {purged} old events and {keys} expired idempotency keys purged."
+                ))
+                return
+            if not (done or failed):
+                if last_purge is None or time.monotonic() - last_purge >= PURGE_INTERVAL:
+                    purge_processed(keep)
+                    purge_expired_keys()
+                    last_purge = time.monotonic()
+                time.sleep(options['interval'])
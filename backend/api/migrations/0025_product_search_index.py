@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_product_search USING fts5("
+        "name, category, colors, sizes, sale_price UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    Product = apps.get_model('api', 'Product')
+    rows = []
+    for product in Product.objects.prefetch_related('variants'):
+        variants = list(product.variants.all())
+        rows.append([
+            product.id,
+            product.name,
+            product.category or '',
+            ' '.join(sorted({v.color for v in variants})),
+            ' '.join(sorted({v.size for v in variants})),
+            str(product.sale_price),
+        ])
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO api_product_search (rowid, name, category, colors, sizes, sale_price) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            rows
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS api_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_passwordresettoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:50
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_content_hash(apps, schema_editor):
+    # Same digest as api.storage.content_hash, kept here so the migration
+    # does not depend on that module.
+    ProductImage = apps.get_model('api', 'ProductImage')
+    updated = []
+    for image in ProductImage.objects.exclude(image='').exclude(image__isnull=True):
+        try:
+            with image.image.open('rb') as f:
+                digest = hashlib.sha256()
+                for chunk in f.chunks():
+                    digest.update(chunk)
+                image.content_hash = digest.hexdigest()
+        except OSError:
+            continue
+        updated.append(image)
+    ProductImage.objects.bulk_update(updated, ['content_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
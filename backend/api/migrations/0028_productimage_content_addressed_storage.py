@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:52
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_productimage_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='products/'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:08
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_order_summary(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    Coupon = apps.get_model('api', 'Coupon')
+    coupons = dict(Coupon.objects.filter(is_used=True).values_list('code', 'value'))
+    batch = []
+    for order in Order.objects.prefetch_related('items').iterator(chunk_size=500):
+        items = sorted(order.items.all(), key=lambda item: item.id)
+        order.item_count = sum(item.quantity for item in items)
+        order.original_cart_total = sum((item.sale_price * item.quantity for item in items), Decimal('0.00'))
+        order.coupon_discount = Decimal('0.00')
+        if order.coupon_code in coupons and items:
+            order.coupon_discount = min(coupons[order.coupon_code], items[0].sale_price)
+        batch.append(order)
+        if len(batch) >= 500:
+            Order.objects.bulk_update(batch, ['item_count', 'original_cart_total', 'coupon_discount'])
+            batch = []
+    Order.objects.bulk_update(batch, ['item_count', 'original_cart_total', 'coupon_discount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_outbox_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='coupon_discount',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='original_cart_total',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=10),
+        ),
+        migrations.RunPython(backfill_order_summary, migrations.RunPython.noop),
+    ]
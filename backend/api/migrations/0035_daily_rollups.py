@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+REPORT_FIELDS = ('total_orders', 'total_sales', 'total_sales_with_delivery', 'total_profit')
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Fill Report and ReportProductSales from the delivered orders. This is a
+    frozen copy of api.rollups.rebuild_rollups as it stood when the tables
+    were added, so later changes to that module do not affect this step.
+    """
+    Order = apps.get_model('api', 'Order')
+    OrderItem = apps.get_model('api', 'OrderItem')
+    Report = apps.get_model('api', 'Report')
+    ReportProductSales = apps.get_model('api', 'ReportProductSales')
+    tz = timezone.get_current_timezone()
+
+    days = defaultdict(lambda: dict.fromkeys(REPORT_FIELDS, 0))
+    for row in (
+        Order.objects.filter(status='delivered').annotate(day=TruncDate('created_at', tzinfo=tz)).values('day')
+        .annotate(
+            orders=Count('id'),
+            sales=Sum(F('total_price') - F('delivery_fee')),
+            with_delivery=Sum('total_price'),
+        )
+    ):
+        day = days[row['day']]
+        day['total_orders'] = row['orders']
+        day['total_sales'] = row['sales']
+        day['total_sales_with_delivery'] = row['with_delivery']
+
+    product_rows = []
+    for row in (
+        OrderItem.objects.filter(order__status='delivered').annotate(day=TruncDate('order__created_at', tzinfo=tz))
+        .values('day', 'product_variant__product_id')
+        .annotate(
+            units=Sum('quantity'),
+            sale=Sum(F('sale_price') * F('quantity'), output_field=DecimalField()),
+            purchase=Sum(F('purchase_price') * F('quantity'), output_field=DecimalField()),
+        )
+    ):
+        product_rows.append(ReportProductSales(
+            date=row['day'],
+            product_id=row['product_variant__product_id'],
+            quantity_sold=row['units'],
+            total_sale_price=row['sale'],
+            total_purchase_price=row['purchase'],
+            total_profit=row['sale'] - row['purchase'],
+        ))
+        days[row['day']]['total_profit'] += row['sale'] - row['purchase']
+
+    ReportProductSales.objects.all().delete()
+    Report.objects.exclude(date__in=list(days)).delete()
+    existing = {report.date: report for report in Report.objects.filter(date__in=list(days))}
+    created, updated = [], []
+    for day, totals in days.items():
+        report = existing.get(day) or Report(date=day)
+        for field in REPORT_FIELDS:
+            setattr(report, field, totals[field])
+        (updated if report.pk else created).append(report)
+    Report.objects.bulk_create(created, batch_size=500)
+    Report.objects.bulk_update(updated, list(REPORT_FIELDS), batch_size=500)
+    ReportProductSales.objects.bulk_create(product_rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_order_summary_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='total_sales_with_delivery',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='ReportProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('total_sale_price', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('total_purchase_price', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('total_profit', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='api.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='unique_report_product_per_day')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_product_sales(apps, schema_editor):
+    """
+    Fill ProductDailySales from the delivered order items. Like 0035, this
+    is a frozen copy of the aggregation in api.rollups, using only the
+    historical models.
+    """
+    OrderItem = apps.get_model('api', 'OrderItem')
+    ProductDailySales = apps.get_model('api', 'ProductDailySales')
+    tz = timezone.get_current_timezone()
+
+    rows = (
+        OrderItem.objects.filter(order__status='delivered')
+        .annotate(day=TruncDate('order__created_at', tzinfo=tz))
+        .values('day', 'product_variant__product_id', 'product_variant_id')
+        .annotate(
+            units=Sum('quantity'),
+            sale=Sum(F('sale_price') * F('quantity'), output_field=DecimalField()),
+            purchase=Sum(F('purchase_price') * F('quantity'), output_field=DecimalField()),
+        )
+    )
+    ProductDailySales.objects.bulk_create([
+        ProductDailySales(
+            date=row['day'],
+            product_id=row['product_variant__product_id'],
+            variant_id=row['product_variant_id'],
+            quantity_sold=row['units'],
+            total_sale_price=row['sale'],
+            total_purchase_price=row['purchase'],
+            total_profit=row['sale'] - row['purchase'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('total_sale_price', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('total_purchase_price', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('total_profit', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='api.product')),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='api.productvariant')),
+            ],
+        ),
+        migrations.DeleteModel(
+            name='ReportProductSales',
+        ),
+        migrations.AddIndex(
+            model_name='productdailysales',
+            index=models.Index(fields=['product', 'date'], name='api_product_product_e0af84_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productdailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'variant'), name='unique_variant_sales_per_day'),
+        ),
+        migrations.RunPython(backfill_product_sales, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
+from .storage import ContentAddressedStorage
 
 class CustomUser(AbstractUser):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
@@ -8,6 +9,7 @@ class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
     last_activity = models.DateTimeField(null=True, blank=True, default=timezone.now)
     points = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
 
@@ -35,10 +37,10 @@ class Coupon(models.Model):
 class Product(models.Model):
     name = models.CharField(max_length=255)
     purchase_price = models.DecimalField(max_digits=10, decimal_places=2) 
-    sale_price = models.DecimalField(max_digits=10, decimal_places=2)
-    category = models.CharField(max_length=100, blank=True, null=True)
+    sale_price = models.DecimalField(max_digits=10, decimal_places=2, db_index=True)
+    category = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -49,9 +51,14 @@ class ProductVariant(models.Model):
     color = models.CharField(max_length=50)
     size = models.CharField(max_length=50)
     quantity = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('product', 'color', 'size')
+        indexes = [
+            models.Index(fields=['color', 'size']),
+            models.Index(fields=['size']),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.color}, {self.size} ({self.quantity})"
@@ -59,8 +66,10 @@ class ProductVariant(models.Model):
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to="products/", null=True, blank=True)
+    image = models.ImageField(upload_to="products/", storage=ContentAddressedStorage(), null=True, blank=True)
     color = models.CharField(max_length=50, blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    derivatives = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"Image of {self.product.name} ({self.color or 'No color'})"
@@ -84,9 +93,19 @@ class Order(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)  
     shipping_info = models.JSONField(default=dict)
     coupon_code = models.CharField(max_length=50, blank=True, null=True)
+    # Kept in step with the items on every write so reports can just SUM them.
+    item_count = models.PositiveIntegerField(default=0)
+    original_cart_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    coupon_discount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-    
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['user', 'created_at']),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username} ({self.status})"
@@ -106,6 +125,7 @@ class Report(models.Model):
     date = models.DateField(unique=True,null=True)
     total_orders = models.IntegerField(default=0)
     total_sales = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    total_sales_with_delivery = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     total_profit = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -115,7 +135,32 @@ class Report(models.Model):
 
     def __str__(self):
         return f"Report for {self.date}"
-    
+
+
+class ProductDailySales(models.Model):
+    """
+    Units, sales and profit of one variant on one local day, counting
+    delivered orders only. Kept up to date by api.rollups.
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity_sold = models.IntegerField(default=0)
+    total_sale_price = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    total_purchase_price = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    total_profit = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'variant'], name='unique_variant_sales_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.variant_id} on {self.date}: {self.quantity_sold}"
+
 
 
 
@@ -132,3 +177,72 @@ class VisitorLog(models.Model):
 
     def __str__(self):
         return f"Visit at {self.visited_at} from {self.ip_address}"
+
+
+class Tombstone(models.Model):
+    """Records deleted rows so delta sync clients can drop them locally."""
+    model_name = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'deleted_at']),
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} #{self.object_id} deleted at {self.deleted_at}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a create request sent with an Idempotency-Key header, so a
+    retried request gets the original response instead of running again.
+    `status_code` stays empty while the first request is still running.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+
+class OutboxEvent(models.Model):
+    """
+    Side effect of a write (points, coupons, emails, ...) recorded in the
+    same transaction as the write and carried out later by the outbox worker.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.id} ({self.status})"
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+ORDER_STATUSES = ('pending', 'delivered', 'cancelled')
+
+
+def _local_day_start(value, param):
+    day = parse_date(value)
+    if day is None:
+        raise ValidationError({param: "Invalid date format. Use YYYY-MM-DD."})
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def filter_orders(queryset, params):
+    """
+    Narrow an Order queryset by ?status= (comma separated), ?date_from= and
+    ?date_to= (inclusive local dates), ?user= (id) and ?governorate=.
+    """
+    statuses = [s.strip() for s in params.get('status', '').split(',') if s.strip()]
+    if statuses:
+        invalid = [s for s in statuses if s not in ORDER_STATUSES]
+        if invalid:
+            raise ValidationError({'status': f"Invalid status: {', '.join(invalid)}"})
+        queryset = queryset.filter(status__in=statuses)
+
+    if params.get('date_from'):
+        queryset = queryset.filter(created_at__gte=_local_day_start(params['date_from'], 'date_from'))
+    if params.get('date_to'):
+        end = _local_day_start(params['date_to'], 'date_to') + timedelta(days=1)
+        queryset = queryset.filter(created_at__lt=end)
+
+    if params.get('user'):
+        try:
+            queryset = queryset.filter(user_id=int(params['user']))
+        except ValueError:
+            raise ValidationError({'user': "A valid user id is required."})
+
+    if params.get('governorate'):
+        queryset = queryset.filter(shipping_info__governorate=params['governorate'])
+
+    return queryset
@@ -0,0 +1,131 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_executor = None
+_executor_lock = threading.Lock()
+_drain_queued = threading.Event()
+
+
+def handler(topic):
+    """Register the function that carries out events of `topic`."""
+    def register(func):
+        _handlers[topic] = func
+        return func
+    return register
+
+
+def publish(topic, payload):
+    """
+    Record an event in the caller's transaction. It is only visible to the
+    worker once that transaction commits, and disappears if it rolls back.
+    """
+    event = OutboxEvent.objects.create(topic=topic, payload=payload)
+    if settings.OUTBOX_WORKERS:
+        transaction.on_commit(schedule_drain)
+    return event
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(settings.OUTBOX_RETRY_MAX_DELAY, 2 ** attempts))
+
+
+def _claim(event_id, now):
+    # A conditional UPDATE instead of SELECT ... FOR UPDATE SKIP LOCKED, which
+    # SQLite lacks: only one worker gets rowcount 1 for a given event.
+    stale = now - timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT)
+    return OutboxEvent.objects.filter(
+        Q(status='pending') | Q(status='processing', locked_at__lt=stale), pk=event_id
+    ).update(status='processing', locked_at=now, attempts=F('attempts') + 1)
+
+
+def _run(event):
+    func = _handlers.get(event.topic)
+    try:
+        if func is None:
+            raise LookupError(f"No outbox handler for topic '{event.topic}'.")
+        # The handler's writes and the 'done' mark commit together, so a crash
+        # in between leaves the event to be retried rather than half applied.
+        with transaction.atomic():
+            func(event.payload)
+            OutboxEvent.objects.filter(pk=event.pk).update(status='done', processed_at=timezone.now(), last_error='')
+        return True
+    except Exception as e:
+        logger.error(f"Outbox event {event.id} ({event.topic}) failed on attempt {event.attempts}: {str(e)}")
+        failed = event.attempts >= settings.OUTBOX_MAX_ATTEMPTS
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            status='failed' if failed else 'pending',
+            available_at=timezone.now() + _retry_delay(event.attempts),
+            last_error=str(e)[:2000],
+        )
+        return False
+
+
+def drain(batch_size=100):
+    """
+    Carry out every event that is due, oldest first. Returns (done, failed).
+    Safe to run from several threads or processes at once.
+    """
+    done = failed = 0
+    while True:
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT)
+        due = list(
+            OutboxEvent.objects.filter(
+                Q(status='pending', available_at__lte=now) | Q(status='processing', locked_at__lt=stale)
+            ).order_by('available_at', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        if not due:
+            return done, failed
+        for event_id in due:
+            if not _claim(event_id, now):
+                continue
+            event = OutboxEvent.objects.get(pk=event_id)
+            if _run(event):
+                done += 1
+            else:
+                failed += 1
+        if len(due) < batch_size:
+            return done, failed
+
+
+def _drain_in_background():
+    _drain_queued.clear()
+    close_old_connections()
+    try:
+        drain()
+    except Exception as e:
+        logger.error(f"Outbox drain failed: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.OUTBOX_WORKERS, thread_name_prefix='outbox')
+        return _executor
+
+
+def schedule_drain():
+    """Drain the outbox off the request thread; several commits share one queued drain."""
+    if _drain_queued.is_set():
+        return
+    _drain_queued.set()
+    _get_executor().submit(_drain_in_background)
+
+
+def purge_processed(older_than):
+    return OutboxEvent.objects.filter(status='done', processed_at__lt=timezone.now() - older_than).delete()[0]
@@ -0,0 +1,137 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+from datetime import datetime, date
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+class KeysetPagination:
+    """
+    Cursor pagination over a fixed, unique ordering (e.g. ('-created_at', '-id')).
+
+    Each page is fetched with a `WHERE (a, b) < (last_a, last_b)` style filter
+    instead of an OFFSET, so the cost of a page does not grow with its depth.
+    """
+    ordering = ('-id',)
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, ordering=None, page_size=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        if page_size is not None:
+            self.page_size = page_size
+        self.next_cursor = None
+
+    @classmethod
+    def is_requested(cls, request):
+        params = request.query_params
+        return cls.cursor_query_param in params or cls.page_size_query_param in params
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if not value:
+            return self.page_size
+        try:
+            size = int(value)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: "Must be an integer."})
+        if size < 1:
+            raise ValidationError({self.page_size_query_param: "Must be greater than zero."})
+        return min(size, self.max_page_size)
+
+    def _fields(self):
+        return [(f.lstrip('-'), f.startswith('-')) for f in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = [_dump_value(getattr(obj, name)) for name, _ in self._fields()]
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, queryset):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            fields = self._fields()
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            model = queryset.model
+            return [
+                _load_value(model._meta.get_field(name), value)
+                for (name, _), value in zip(fields, values)
+            ]
+        except (ValueError, TypeError, InvalidOperation, DjangoValidationError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+
+    def _after(self, values):
+        # Expands (a, b, c) > (x, y, z) into
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self._fields(), values):
+            lookup = f"{name}__lt" if descending else f"{name}__gt"
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request):
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor, queryset)))
+
+        page = list(queryset[:page_size + 1])
+        has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if has_next else None
+        self.request = request
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = self.next_cursor
+        return self.request.build_absolute_uri(f"{self.request.path}?{params.urlencode()}")
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        }
+
+
+def _dump_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load_value(field, value):
+    internal_type = field.get_internal_type()
+    if value is None:
+        return None
+    if internal_type == 'DateTimeField':
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError
+        return parsed
+    if internal_type == 'DateField':
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError
+        return parsed
+    if internal_type == 'DecimalField':
+        return Decimal(value)
+    return field.to_python(value)
@@ -0,0 +1,246 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index held in process memory.
+
+    Every entry is stored under its full lower-cased text and under each of
+    its words, so "shi" finds both "Shirt" and "Blue Shirt". Lookups are a
+    bisect plus a short forward scan and never touch the database; the
+    index is loaded in the background when the process serves its first
+    request (see warm_prefix_indexes), or on first use if that has not
+    finished yet, and then kept current by model signals. It is rebuilt in
+    the background when PREFIX_INDEX_MAX_AGE passes or when invalidate() is
+    called from any process sharing the cache, and searches keep using the
+    old lists meanwhile.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._keys = []
+        self._keys_by_id = {}
+        self._payloads = {}
+        self._built_at = None
+        self._generation = None
+        # Writes seen while a build is loading, replayed onto its result.
+        self._pending = None
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.updates = 0
+
+    @property
+    def _generation_key(self):
+        return f'prefix-index:{self.name}:generation'
+
+    @staticmethod
+    def _tokens(text):
+        text = (text or '').strip().lower()
+        if not text:
+            return set()
+        return {text, *re.findall(r'\w+', text)}
+
+    def _is_stale(self):
+        if self._built_at is None:
+            return True
+        if cache.get(self._generation_key) != self._generation:
+            return True
+        max_age = settings.PREFIX_INDEX_MAX_AGE
+        return bool(max_age) and time.monotonic() - self._built_at > max_age
+
+    def invalidate(self):
+        """Make every process sharing the cache rebuild this index on its next search."""
+        try:
+            cache.incr(self._generation_key)
+        except ValueError:
+            cache.add(self._generation_key, 1, None)
+
+    def _build(self):
+        with self._lock:
+            self._pending = []
+        generation = cache.get(self._generation_key)
+        keys, keys_by_id, payloads = [], {}, {}
+        try:
+            for obj_id, text, payload in self.loader():
+                tokens = self._tokens(text)
+                keys.extend((token, obj_id) for token in tokens)
+                keys_by_id[obj_id] = tokens
+                payloads[obj_id] = payload
+            keys.sort()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._keys, self._keys_by_id, self._payloads = keys, keys_by_id, payloads
+            for obj_id, text, payload in self._pending:
+                if payload is None:
+                    self._discard(obj_id)
+                else:
+                    self._insert(obj_id, text, payload)
+            self._pending = None
+            self._built_at = time.monotonic()
+            self._generation = generation
+            self.rebuilds += 1
+
+    def rebuild(self):
+        with self._build_lock:
+            self._build()
+
+    def _warm(self):
+        try:
+            if self._is_stale():
+                self._build()
+        except Exception:
+            logger.exception(f"Failed to build the {self.name} prefix index")
+        finally:
+            self._build_lock.release()
+
+    def _warm_in_thread(self):
+        close_old_connections()
+        try:
+            self._warm()
+        finally:
+            close_old_connections()
+
+    def warm(self):
+        """
+        Rebuild if stale, unless a build is already running. The build runs in
+        a background thread, or inline when PREFIX_INDEX_BACKGROUND_BUILDS is off.
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return False
+        if settings.PREFIX_INDEX_BACKGROUND_BUILDS:
+            threading.Thread(target=self._warm_in_thread, name=f'prefix-index-{self.name}', daemon=True).start()
+        else:
+            self._warm()
+        return True
+
+    def _ensure_built(self):
+        if not self._is_stale():
+            return
+        if self._built_at is None:
+            # Nothing to serve yet, so wait for the first build (or the warm-up already running).
+            with self._build_lock:
+                if self._built_at is None:
+                    self._build()
+        else:
+            self.warm()
+
+    def _discard(self, obj_id):
+        for token in self._keys_by_id.pop(obj_id, ()):
+            position = bisect_left(self._keys, (token, obj_id))
+            if position < len(self._keys) and self._keys[position] == (token, obj_id):
+                del self._keys[position]
+        self._payloads.pop(obj_id, None)
+
+    def _insert(self, obj_id, text, payload):
+        self._discard(obj_id)
+        tokens = self._tokens(text)
+        for token in tokens:
+            insort(self._keys, (token, obj_id))
+        self._keys_by_id[obj_id] = tokens
+        self._payloads[obj_id] = payload
+
+    def upsert(self, obj_id, text, payload):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((obj_id, text, payload))
+            if self._built_at is None:
+                return
+            self._insert(obj_id, text, payload)
+            self.updates += 1
+
+    def remove(self, obj_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((obj_id, None, None))
+            if self._built_at is None:
+                return
+            self._discard(obj_id)
+            self.updates += 1
+
+    def search(self, query, limit=10):
+        prefix = (query or '').strip().lower()
+        self._ensure_built()
+        with self._lock:
+            results, seen = [], set()
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                token, obj_id = self._keys[position]
+                if not token.startswith(prefix):
+                    break
+                if obj_id not in seen:
+                    seen.add(obj_id)
+                    results.append(self._payloads[obj_id])
+                position += 1
+            if results:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._payloads),
+                'keys': len(self._keys),
+                'warm': self._built_at is not None,
+                'age_seconds': None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'rebuilds': self.rebuilds,
+                'updates': self.updates,
+            }
+
+
+def user_payload(user):
+    return {'id': user.id, 'first_name': user.first_name}
+
+
+def product_payload(product):
+    return {'id': product.id, 'name': product.name, 'sale_price': f"{Decimal(str(product.sale_price)):.2f}"}
+
+
+def _load_users():
+    from .models import CustomUser
+    for user in CustomUser.objects.only('id', 'first_name').iterator():
+        yield user.id, user.first_name, user_payload(user)
+
+
+def _load_products():
+    from .models import Product
+    for product in Product.objects.only('id', 'name', 'sale_price').iterator():
+        yield product.id, product.name, product_payload(product)
+
+
+user_index = PrefixIndex('users', _load_users)
+product_index = PrefixIndex('products', _load_products)
+
+
+WARM_UP_UID = 'api.prefix_index.warm_prefix_indexes'
+
+
+def warm_prefix_indexes(**kwargs):
+    """request_started receiver that loads both indexes in the background, once per process."""
+    if not settings.PREFIX_INDEX_BACKGROUND_BUILDS:
+        return
+    request_started.disconnect(dispatch_uid=WARM_UP_UID)
+    user_index.warm()
+    product_index.warm()
@@ -0,0 +1,341 @@
+from datetime import datetime, timedelta
+
+from django.db.models import Case, CharField, Count, DateField, F, Q, Sum, Value, When, prefetch_related_objects
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import Order, Report, ProductDailySales, VisitorLog
+
+REPORT_GROUPS = ('day', 'week', 'month')
+# ?order_by= value -> annotation ranked by best_sellers()
+BEST_SELLER_ORDERING = {'quantity': 'units', 'sales': 'sales', 'profit': 'profit'}
+
+
+def parse_report_day(value, param):
+    day = parse_date(value or '')
+    if day is None:
+        raise ValidationError({param: "Invalid date format. Use YYYY-MM-DD."})
+    return day
+
+
+def report_range(params, default_days=30):
+    """Local days ?from=..?to= (inclusive), defaulting to the last `default_days` days up to today."""
+    last_day = parse_report_day(params.get('to'), 'to') if params.get('to') else timezone.localdate()
+    first_day = parse_report_day(params.get('from'), 'from') if params.get('from') else last_day - timedelta(days=default_days - 1)
+    if first_day > last_day:
+        raise ValidationError({'from': "'from' must not be after 'to'."})
+    return first_day, last_day
+
+
+def report_group(params):
+    group = params.get('group', 'day')
+    if group not in REPORT_GROUPS:
+        raise ValidationError({'group': f"Use one of: {', '.join(REPORT_GROUPS)}."})
+    return group
+
+
+def delivered_orders(start, end):
+    return Order.objects.filter(created_at__gte=start, created_at__lt=end, status='delivered')
+
+
+def order_details(orders):
+    orders = list(orders)
+    prefetch_related_objects(orders, 'items__product_variant__product')
+    details = []
+    for order in orders:
+        details.append({
+            'order_id': order.id,
+            'original_cart_total': float(order.original_cart_total),
+            'cart_total': float(order.cart_total),
+            'delivery_fee': float(order.delivery_fee),
+            'total_price': float(order.total_price),
+            'coupon_code': order.coupon_code,
+            'coupon_discount': float(order.coupon_discount),
+            'items': [
+                {
+                    'product_name': item.product_variant.product.name,
+                    'quantity': item.quantity,
+                    'sale_price': float(item.sale_price),
+                    'total_sale_price': float(item.sale_price * item.quantity),
+                }
+                for item in order.items.all()
+            ]
+        })
+    return details
+
+
+def rollup_totals(periods):
+    """
+    Report totals for each of several named, non-overlapping day ranges
+    ({name: (first_day, last_day)}), from a single grouped query.
+    """
+    condition = Q()
+    for first_day, last_day in periods.values():
+        condition |= Q(date__gte=first_day, date__lte=last_day)
+    totals = {
+        name: {'total_orders': 0, 'total_sales': 0.0, 'total_sales_with_delivery': 0.0, 'total_profit': 0.0}
+        for name in periods
+    }
+    rows = (
+        Report.objects.filter(condition)
+        .annotate(period=Case(
+            *[When(date__gte=first_day, date__lte=last_day, then=Value(name)) for name, (first_day, last_day) in periods.items()],
+            output_field=CharField(),
+        ))
+        .values('period')
+        .annotate(
+            orders=Sum('total_orders'),
+            sales=Sum('total_sales'),
+            with_delivery=Sum('total_sales_with_delivery'),
+            profit=Sum('total_profit'),
+        )
+        .order_by()
+    )
+    for row in rows:
+        totals[row['period']] = {
+            'total_orders': row['orders'],
+            'total_sales': float(row['sales']),
+            'total_sales_with_delivery': float(row['with_delivery']),
+            'total_profit': float(row['profit']),
+        }
+    return totals
+
+
+def visitors_by_period(periods):
+    """Distinct visitor IPs in each named, non-overlapping day range, from a single grouped query."""
+    bounds = {name: local_day_bounds(first_day, last_day) for name, (first_day, last_day) in periods.items()}
+    condition = Q()
+    for start, end in bounds.values():
+        condition |= Q(visited_at__gte=start, visited_at__lt=end)
+    label = Case(
+        *[When(visited_at__gte=start, visited_at__lt=end, then=Value(name)) for name, (start, end) in bounds.items()],
+        output_field=CharField(),
+    )
+    visitors = dict.fromkeys(periods, 0)
+    rows = (
+        VisitorLog.objects.filter(condition).annotate(period=label).values('period')
+        .annotate(visitors=Count('ip_address', distinct=True)).order_by()
+    )
+    for row in rows:
+        visitors[row['period']] = row['visitors']
+    return visitors
+
+
+def preceding_period(first_day, last_day):
+    """The days of the same length immediately before first_day..last_day."""
+    length = last_day - first_day + timedelta(days=1)
+    return first_day - length, last_day - length
+
+
+def report_baseline(params, first_day, last_day, previous):
+    """
+    Days to compare first_day..last_day against: `previous` for
+    ?compare=previous, or an explicit ?baseline_from=&baseline_to=.
+    None when no comparison was asked for.
+    """
+    if params.get('baseline_from') or params.get('baseline_to'):
+        baseline = (
+            parse_report_day(params.get('baseline_from'), 'baseline_from'),
+            parse_report_day(params.get('baseline_to'), 'baseline_to'),
+        )
+        if baseline[0] > baseline[1]:
+            raise ValidationError({'baseline_from': "'baseline_from' must not be after 'baseline_to'."})
+        if baseline[0] <= last_day and baseline[1] >= first_day:
+            raise ValidationError({'baseline_from': "The baseline must not overlap the reported period."})
+        return baseline
+    compare = params.get('compare')
+    if not compare:
+        return None
+    if compare != 'previous':
+        raise ValidationError({'compare': "Use 'previous', or pass baseline_from and baseline_to."})
+    return previous
+
+
+def _deltas(current, baseline):
+    return {
+        field: {
+            'change': round(current[field] - baseline[field], 2),
+            'percent': round((current[field] - baseline[field]) / baseline[field] * 100, 2) if baseline[field] else None,
+        }
+        for field in current
+    }
+
+
+def rollup_report(first_day, last_day, baseline=None):
+    """
+    Totals, visitors and per-product sales for the local days
+    first_day..last_day (inclusive), summed from the daily rollups kept by
+    api.rollups. With a `baseline` (first_day, last_day) the totals of both
+    periods come from the same grouped queries, and the baseline's totals
+    and the deltas against it are added.
+    """
+    periods = {'current': (first_day, last_day)}
+    if baseline:
+        periods['baseline'] = baseline
+    totals = rollup_totals(periods)
+    visitors = visitors_by_period(periods)
+    for name in periods:
+        totals[name]['total_visitors'] = visitors[name]
+
+    products = (
+        ProductDailySales.objects.filter(date__gte=first_day, date__lte=last_day)
+        .values('product_id', 'product__name')
+        .annotate(
+            units=Sum('quantity_sold'),
+            sales=Sum('total_sale_price'),
+            purchases=Sum('total_purchase_price'),
+            profit=Sum('total_profit'),
+        )
+        .filter(units__gt=0)
+        .order_by('product__name')
+    )
+    report = {
+        **totals['current'],
+        'products': [
+            {
+                'product_id': row['product_id'],
+                'product_name': row['product__name'],
+                'quantity_sold': row['units'],
+                'total_sale_price': float(row['sales']),
+                'total_purchase_price': float(row['purchases']),
+                'total_profit': float(row['profit'])
+            }
+            for row in products
+        ],
+    }
+    if baseline:
+        report['baseline'] = {'from': baseline[0].isoformat(), 'to': baseline[1].isoformat(), **totals['baseline']}
+        report['deltas'] = _deltas(totals['current'], totals['baseline'])
+    return report
+
+
+def _period(group):
+    return {'day': F('date'), 'week': TruncWeek('date'), 'month': TruncMonth('date')}[group]
+
+
+def local_period(field, group='day'):
+    """
+    SQL expression for the local day, week (starting Monday) or month, as a
+    date, that the datetime `field` falls in. Grouping on it buckets rows by
+    TIME_ZONE in the database rather than by per-period bounds in Python.
+    """
+    trunc = {'day': TruncDate, 'week': TruncWeek, 'month': TruncMonth}[group]
+    return trunc(field, tzinfo=timezone.get_current_timezone(), output_field=DateField())
+
+
+def visitor_series(first_day, last_day, group='day'):
+    """Distinct visitor IPs per local day, week or month of first_day..last_day: {period: count}."""
+    start, end = local_day_bounds(first_day, last_day)
+    rows = (
+        VisitorLog.objects.filter(visited_at__gte=start, visited_at__lt=end)
+        .annotate(period=local_period('visited_at', group)).values('period')
+        .annotate(visitors=Count('ip_address', distinct=True))
+        .order_by('period')
+    )
+    return {row['period']: row['visitors'] for row in rows}
+
+
+def rollup_series(first_day, last_day, group='day'):
+    """
+    One row per day, week (starting Monday) or month with sales and
+    visitors, each from a single GROUP BY.
+    """
+    period = _period(group)
+    rows = (
+        Report.objects.filter(date__gte=first_day, date__lte=last_day)
+        .annotate(period=period).values('period')
+        .annotate(
+            orders=Sum('total_orders'),
+            sales=Sum('total_sales'),
+            with_delivery=Sum('total_sales_with_delivery'),
+            profit=Sum('total_profit'),
+        )
+        .order_by('period')
+    )
+    sales = {row['period']: row for row in rows}
+    visitors = visitor_series(first_day, last_day, group)
+    empty = {'orders': 0, 'sales': 0, 'with_delivery': 0, 'profit': 0}
+    return [
+        {
+            'period': period.isoformat(),
+            'total_orders': row['orders'],
+            'total_sales': float(row['sales']),
+            'total_sales_with_delivery': float(row['with_delivery']),
+            'total_profit': float(row['profit']),
+            'total_visitors': visitors.get(period, 0),
+        }
+        for period, row in ((period, sales.get(period, empty)) for period in sorted(sales.keys() | visitors.keys()))
+    ]
+
+
+def best_sellers(first_day, last_day, order_by='quantity', limit=10):
+    """
+    The top `limit` products of first_day..last_day by units sold, sales or
+    profit, ranked over ProductDailySales.
+    """
+    rows = (
+        ProductDailySales.objects.filter(date__gte=first_day, date__lte=last_day)
+        .values('product_id', 'product__name')
+        .annotate(
+            units=Sum('quantity_sold'),
+            sales=Sum('total_sale_price'),
+            profit=Sum('total_profit'),
+        )
+        .filter(units__gt=0)
+        .order_by(f'-{BEST_SELLER_ORDERING[order_by]}', 'product_id')[:limit]
+    )
+    return [
+        {
+            'product_id': row['product_id'],
+            'product_name': row['product__name'],
+            'quantity_sold': row['units'],
+            'total_sale_price': float(row['sales']),
+            'total_profit': float(row['profit']),
+        }
+        for row in rows
+    ]
+
+
+def product_sales_series(product_id, first_day, last_day, group='day'):
+    """
+    One product's sales per day, week or month, with a per-variant
+    breakdown, from a single GROUP BY over ProductDailySales.
+    """
+    rows = (
+        ProductDailySales.objects.filter(product_id=product_id, date__gte=first_day, date__lte=last_day)
+        .annotate(period=_period(group))
+        .values('period', 'variant_id', 'variant__color', 'variant__size')
+        .annotate(
+            units=Sum('quantity_sold'),
+            sales=Sum('total_sale_price'),
+            profit=Sum('total_profit'),
+        )
+        .order_by('period', 'variant_id')
+    )
+    series = {}
+    for row in rows:
+        period = row['period'].isoformat()
+        entry = series.setdefault(period, {
+            'period': period, 'quantity_sold': 0, 'total_sale_price': 0.0, 'total_profit': 0.0, 'variants': [],
+        })
+        entry['quantity_sold'] += row['units']
+        entry['total_sale_price'] += float(row['sales'])
+        entry['total_profit'] += float(row['profit'])
+        entry['variants'].append({
+            'variant_id': row['variant_id'],
+            'color': row['variant__color'],
+            'size': row['variant__size'],
+            'quantity_sold': row['units'],
+            'total_sale_price': float(row['sales']),
+            'total_profit': float(row['profit']),
+        })
+    return list(series.values())
+
+
+def local_day_bounds(first_day, last_day):
+    """Aware datetimes [start, end) covering the local days first_day..last_day."""
+    start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+    return start, end
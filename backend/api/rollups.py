@@ -0,0 +1,150 @@
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+
+from .reports import local_day_bounds, local_period
+
+REPORT_FIELDS = ('total_orders', 'total_sales', 'total_sales_with_delivery', 'total_profit')
+PRODUCT_FIELDS = ('quantity_sold', 'total_sale_price', 'total_purchase_price', 'total_profit')
+
+
+def _models(apps=None):
+    apps = apps or django_apps
+    return (
+        apps.get_model('api', 'Order'),
+        apps.get_model('api', 'OrderItem'),
+        apps.get_model('api', 'Report'),
+        apps.get_model('api', 'ProductDailySales'),
+    )
+
+
+def _aggregate(orders, items):
+    """
+    Daily and per-variant totals of the delivered `orders` and their `items`, as
+    ({date: {field: value}}, {(date, product_id, variant_id): {field: value}}).
+    """
+    days = defaultdict(lambda: dict.fromkeys(REPORT_FIELDS, 0))
+    for row in (
+        orders.filter(status='delivered').annotate(day=local_period('created_at')).values('day')
+        .annotate(
+            orders=Count('id'),
+            sales=Sum(F('total_price') - F('delivery_fee')),
+            with_delivery=Sum('total_price'),
+        )
+    ):
+        day = days[row['day']]
+        day['total_orders'] = row['orders']
+        day['total_sales'] = row['sales']
+        day['total_sales_with_delivery'] = row['with_delivery']
+
+    products = {}
+    for row in (
+        items.filter(order__status='delivered').annotate(day=local_period('order__created_at'))
+        .values('day', 'product_variant__product_id', 'product_variant_id')
+        .annotate(
+            units=Sum('quantity'),
+            sale=Sum(F('sale_price') * F('quantity'), output_field=DecimalField()),
+            purchase=Sum(F('purchase_price') * F('quantity'), output_field=DecimalField()),
+        )
+    ):
+        products[(row['day'], row['product_variant__product_id'], row['product_variant_id'])] = {
+            'quantity_sold': row['units'],
+            'total_sale_price': row['sale'],
+            'total_purchase_price': row['purchase'],
+            'total_profit': row['sale'] - row['purchase'],
+        }
+        days[row['day']]['total_profit'] += row['sale'] - row['purchase']
+    return dict(days), products
+
+
+def snapshot(order_ids):
+    """What the given orders currently contribute to the rollups."""
+    Order, OrderItem, _, _ = _models()
+    if not order_ids:
+        return {}, {}
+    return _aggregate(Order.objects.filter(id__in=order_ids), OrderItem.objects.filter(order_id__in=order_ids))
+
+
+def _difference(before, after):
+    delta = {}
+    for key in before.keys() | after.keys():
+        old, new = before.get(key, {}), after.get(key, {})
+        change = {field: new.get(field, 0) - old.get(field, 0) for field in old.keys() | new.keys()}
+        if any(change.values()):
+            delta[key] = change
+    return delta
+
+
+def apply_change(before, after):
+    """
+    Move the rollups from the `before` snapshot to the `after` one with
+    F() increments, touching only the days and variants that differ.
+    """
+    _, _, Report, ProductDailySales = _models()
+    day_delta = _difference(before[0], after[0])
+    product_delta = _difference(before[1], after[1])
+
+    for day, change in day_delta.items():
+        Report.objects.get_or_create(date=day)
+        Report.objects.filter(date=day).update(**{field: F(field) + value for field, value in change.items()})
+    for (day, product_id, variant_id), change in product_delta.items():
+        ProductDailySales.objects.get_or_create(date=day, product_id=product_id, variant_id=variant_id)
+        ProductDailySales.objects.filter(date=day, variant_id=variant_id).update(
+            **{field: F(field) + value for field, value in change.items()}
+        )
+    if product_delta:
+        ProductDailySales.objects.filter(
+            date__in={key[0] for key in product_delta}, quantity_sold__lte=0
+        ).delete()
+
+
+@contextmanager
+def track_orders(order_ids):
+    """
+    Keep the rollups in step with whatever the block does to these orders
+    (status changes, item edits, price edits). Use inside the transaction
+    that makes the change.
+    """
+    before = snapshot(order_ids)
+    yield
+    apply_change(before, snapshot(order_ids))
+
+
+def rebuild_rollups(apps=None, first_day=None, last_day=None):
+    """
+    Recompute the Report and ProductDailySales rows from the orders, for
+    every day or only for the local days first_day..last_day.
+    """
+    Order, OrderItem, Report, ProductDailySales = _models(apps)
+    orders, items = Order.objects.all(), OrderItem.objects.all()
+    reports, product_sales = Report.objects.all(), ProductDailySales.objects.all()
+    if first_day is not None:
+        start = local_day_bounds(first_day, first_day)[0]
+        orders, items = orders.filter(created_at__gte=start), items.filter(order__created_at__gte=start)
+        reports, product_sales = reports.filter(date__gte=first_day), product_sales.filter(date__gte=first_day)
+    if last_day is not None:
+        end = local_day_bounds(last_day, last_day)[1]
+        orders, items = orders.filter(created_at__lt=end), items.filter(order__created_at__lt=end)
+        reports, product_sales = reports.filter(date__lte=last_day), product_sales.filter(date__lte=last_day)
+
+    days, products = _aggregate(orders, items)
+    with transaction.atomic():
+        product_sales.delete()
+        reports.exclude(date__in=list(days)).delete()
+        existing = {report.date: report for report in Report.objects.filter(date__in=list(days))}
+        created, updated = [], []
+        for day, totals in days.items():
+            report = existing.get(day) or Report(date=day)
+            for field in REPORT_FIELDS:
+                setattr(report, field, totals[field])
+            (updated if report.pk else created).append(report)
+        Report.objects.bulk_create(created, batch_size=500)
+        Report.objects.bulk_update(updated, list(REPORT_FIELDS), batch_size=500)
+        ProductDailySales.objects.bulk_create([
+            ProductDailySales(date=day, product_id=product_id, variant_id=variant_id, **totals)
+            for (day, product_id, variant_id), totals in products.items()
+        ], batch_size=500)
+    return len(days), len(products)
@@ -0,0 +1,115 @@
+import re
+
+from django.db import connection, transaction
+
+from .models import Product
+
+SEARCH_TABLE = 'api_product_search'
+
+# bm25 column weights: name, category, colors, sizes
+RANK_WEIGHTS = (10.0, 3.0, 1.0, 1.0)
+
+# Databases (by NAME) known to have the search table. Only a positive answer
+# is remembered, so a process that first asked before `migrate` created the
+# table picks it up on a later call instead of falling back forever.
+_fts_databases = set()
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_databases:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [SEARCH_TABLE]
+            )
+            if cursor.fetchone() is None:
+                return False
+        _fts_databases.add(name)
+    return True
+
+
+def reset_fts_available():
+    _fts_databases.clear()
+
+
+def _document(product):
+    variants = list(product.variants.all())
+    return [
+        product.id,
+        product.name,
+        product.category or '',
+        ' '.join(sorted({v.color for v in variants})),
+        ' '.join(sorted({v.size for v in variants})),
+        str(product.sale_price),
+    ]
+
+
+def index_products(product_ids):
+    product_ids = list(product_ids)
+    if not product_ids or not fts_available():
+        return
+    products = Product.objects.filter(id__in=product_ids).prefetch_related('variants')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(product_ids))})",
+            product_ids
+        )
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, name, category, colors, sizes, sale_price) "
+            f"VALUES (%s, %s, %s, %s, %s, %s)",
+            [_document(p) for p in products]
+        )
+
+
+def rebuild_index():
+    reset_fts_available()
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    ids = list(Product.objects.values_list('id', flat=True))
+    for start in range(0, len(ids), 500):
+        index_products(ids[start:start + 500])
+    return len(ids)
+
+
+def schedule_reindex(product_id):
+    transaction.on_commit(lambda: index_products([product_id]))
+
+
+def _match_expression(query):
+    # Every term must match, the last one (still being typed) as a prefix.
+    terms = re.findall(r'\w+', query.lower())
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_products(query, limit=10):
+    """
+    Ranked product search over name, category, colors and sizes.
+
+    Returns a list of {'id', 'name', 'sale_price'} dicts. Falls back to a
+    name__icontains scan when the FTS5 table is not available (e.g. on a
+    non-SQLite database).
+    """
+    match = _match_expression(query)
+    if match is None or not fts_available():
+        products = Product.objects.filter(name__icontains=query.strip())[:limit]
+        return [{'id': p.id, 'name': p.name, 'sale_price': str(p.sale_price)} for p in products]
+
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, name, sale_price FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s",
+            [match, limit]
+        )
+        rows = cursor.fetchall()
+    return [{'id': row[0], 'name': row[1], 'sale_price': row[2]} for row in rows]
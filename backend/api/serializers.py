@@ -3,26 +3,112 @@ from django.contrib.auth import get_user_model
 from .models import Product, ProductVariant, ProductImage,CustomUser,Order,Report,OrderItem,Coupon
 import logging
 import json
-import uuid
+from contextlib import nullcontext
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Q, prefetch_related_objects
 from django.utils import timezone
 from decimal import Decimal
+from . import search
+from .catalog_cache import catalog_changed
+from .storage import content_hash
+from .images import schedule_derivatives, srcset
+from .inventory import apply_stock_deltas
+from .loyalty import publish_status_changes
+from . import rollups
 
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
 
+class SparseFieldsMixin:
+    """
+    Lets list/detail views ask for a subset of fields.
+
+    `fields` keeps only the named top-level fields and `expand` switches on
+    the representations listed in `expandable_fields`. `optimize_queryset`
+    applies the same selection to SQL: only the needed columns are loaded
+    and relations are joined or prefetched only when they are serialized.
+    """
+    optional_fields = ()
+    expandable_fields = ()
+    column_map = {}
+    expand_column_map = {}
+    select_map = {}
+    prefetch_map = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expand = set(expand or ())
+        self.requested_fields = keep = set(fields) if fields is not None else None
+        for name in list(self.fields):
+            if keep is not None and name not in keep and not self.fields[name].write_only:
+                self.fields.pop(name)
+            elif keep is None and name in self.optional_fields:
+                self.fields.pop(name)
+
+    @classmethod
+    def readable_fields(cls):
+        # Building a serializer instance is not free, so compute this once per class.
+        if '_readable_field_names' not in cls.__dict__:
+            cls._readable_field_names = tuple(
+                [name for name, field in cls().fields.items() if not field.write_only] + list(cls.optional_fields)
+            )
+        return cls._readable_field_names
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=()):
+        opts = cls.Meta.model._meta
+        concrete = {f.name for f in opts.concrete_fields}
+        selected = set(fields) if fields is not None else set(cls.readable_fields()) - set(cls.optional_fields)
+        columns, related, prefetches = {opts.pk.name}, [], []
+        for name in selected:
+            columns.update(cls.column_map.get(name, [name] if name in concrete else []))
+            related += [r for r in cls.select_map.get(name, []) if r not in related]
+            prefetches += [p for p in cls.prefetch_map.get(name, []) if p not in prefetches]
+        for name in expand:
+            columns.update(cls.expand_column_map.get(name, []))
+            if name not in related:
+                related.append(name)
+        queryset = queryset.only(*columns)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+
+def parse_fieldset(request, serializer_class):
+    """Read ?fields= and ?expand= for `serializer_class`, rejecting unknown names."""
+    def split(param):
+        value = request.query_params.get(param, '')
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    fields, expand = split('fields'), split('expand')
+    unknown = [f for f in fields if f not in serializer_class.readable_fields()]
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+    unknown = [e for e in expand if e not in serializer_class.expandable_fields]
+    if unknown:
+        raise serializers.ValidationError({'expand': f"Cannot expand: {', '.join(unknown)}"})
+    return fields or None, expand
+
+
 class CouponSerializer(serializers.ModelSerializer):
     class Meta:
         model = Coupon
         fields = ['code', 'value', 'created_at', 'is_used', 'used_at']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
     fullName = serializers.CharField(source="get_full_name", read_only=True)
     coupons = CouponSerializer(many=True, read_only=True)
 
+    column_map = {'fullName': ['first_name', 'last_name']}
+    prefetch_map = {'coupons': ['coupons']}
+
     class Meta:
         model = User
         fields = [
@@ -79,30 +165,42 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
+        request = self.context.get('request')
         if instance.image:
-            request = self.context.get('request')
             if request:
                 ret['image'] = request.build_absolute_uri(instance.image.url)
             else:
                 ret['image'] = instance.image.url
+        ret['srcset'] = srcset(instance, request)
         return ret
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     purchase_price = serializers.FloatField()
     sale_price = serializers.FloatField()
     images = ProductImageSerializer(many=True, read_only=False, required=False)
     variants = ProductVariantSerializer(many=True, required=False)
+    image = serializers.SerializerMethodField()
+
+    optional_fields = ('image',)
+    prefetch_map = {'images': ['images'], 'image': ['images'], 'variants': ['variants']}
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'purchase_price', 'sale_price', 'category', 'images', 'variants']
+        fields = ['id', 'name', 'purchase_price', 'sale_price', 'category', 'images', 'variants', 'image']
         read_only_fields = ['id']
 
+    def get_image(self, instance):
+        # The first image only, for listing cards.
+        images = list(instance.images.all())
+        return ProductImageSerializer(images[0], context=self.context).data if images else None
+
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['images'] = ProductImageSerializer(instance.images.all(), many=True, context=self.context).data
-        ret['variants'] = ProductVariantSerializer(instance.variants.all(), many=True).data
+        if 'images' in self.fields:
+            ret['images'] = ProductImageSerializer(instance.images.all(), many=True, context=self.context).data
+        if 'variants' in self.fields:
+            ret['variants'] = ProductVariantSerializer(instance.variants.all(), many=True).data
         return ret
 
     def validate_price(self, data):
@@ -121,21 +219,30 @@ class ProductSerializer(serializers.ModelSerializer):
 
         validated_data.pop('images', None)
         validated_data.pop('variants', None)
-        product = Product.objects.create(**validated_data)
+        with transaction.atomic():
+            product = Product.objects.create(**validated_data)
 
-        for i, image_data in enumerate(images_data):
-            color = colors_data[i] if i < len(colors_data) else None
-            ProductImage.objects.create(product=product, image=image_data, color=color)
+            images = ProductImage.objects.bulk_create([
+                ProductImage(
+                    product=product,
+                    image=image_data,
+                    color=colors_data[i] if i < len(colors_data) else None,
+                    content_hash=content_hash(image_data)
+                )
+                for i, image_data in enumerate(images_data)
+            ])
+            schedule_derivatives([image.id for image in images])
 
-        if variants_data:
-            for variant_str in variants_data:
-                variant_data = json.loads(variant_str)
-                ProductVariant.objects.create(
+            ProductVariant.objects.bulk_create([
+                ProductVariant(
                     product=product,
                     color=variant_data.get('color'),
                     size=variant_data.get('size'),
                     quantity=variant_data.get('quantity', 0)
                 )
+                for variant_data in self._unique_variants(variants_data).values()
+            ])
+            search.schedule_reindex(product.id)
 
         return product
 
@@ -146,28 +253,94 @@ class ProductSerializer(serializers.ModelSerializer):
 
         validated_data.pop('images', None)
         validated_data.pop('variants', None)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if images_data:
-            instance.images.all().delete()
-            for i, image_data in enumerate(images_data):
-                color = colors_data[i] if i < len(colors_data) else None
-                ProductImage.objects.create(product=instance, image=image_data, color=color)
-
-        if variants_data:
-            instance.variants.all().delete()
-            for variant_str in variants_data:
-                variant_data = json.loads(variant_str)
-                ProductVariant.objects.create(
-                    product=instance,
-                    color=variant_data.get('color'),
-                    size=variant_data.get('size'),
-                    quantity=variant_data.get('quantity', 0)
-                )
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+
+            if images_data:
+                self._sync_images(instance, images_data, colors_data)
+            if variants_data:
+                self._sync_variants(instance, variants_data)
+            catalog_changed()
+            search.schedule_reindex(instance.id)
 
         return instance
+
+    @staticmethod
+    def _unique_variants(variants_data):
+        # Keyed by (color, size) case-insensitively, the last entry wins.
+        variants = {}
+        for variant_str in variants_data:
+            variant_data = json.loads(variant_str)
+            key = (str(variant_data.get('color', '')).lower(), str(variant_data.get('size', '')).lower())
+            variants[key] = variant_data
+        return variants
+
+    def _sync_variants(self, instance, variants_data):
+        incoming = self._unique_variants(variants_data)
+        existing = {(v.color.lower(), v.size.lower()): v for v in instance.variants.all()}
+
+        removed = [v.id for key, v in existing.items() if key not in incoming]
+        changed, created = [], []
+        for key, variant_data in incoming.items():
+            color = variant_data.get('color')
+            size = variant_data.get('size')
+            quantity = variant_data.get('quantity', 0)
+            variant = existing.get(key)
+            if variant is None:
+                created.append(ProductVariant(product=instance, color=color, size=size, quantity=quantity))
+            elif (variant.color, variant.size, variant.quantity) != (color, size, quantity):
+                variant.color, variant.size, variant.quantity = color, size, quantity
+                changed.append(variant)
+
+        if removed:
+            # Variants that orders still point at are emptied rather than
+            # deleted, so the CASCADE does not take order history with it.
+            ordered = set(
+                OrderItem.objects.filter(product_variant_id__in=removed)
+                .values_list('product_variant_id', flat=True).distinct()
+            )
+            for variant in existing.values():
+                if variant.id in ordered and variant.quantity:
+                    variant.quantity = 0
+                    changed.append(variant)
+            ProductVariant.objects.filter(id__in=[v for v in removed if v not in ordered]).delete()
+        if changed:
+            now = timezone.now()
+            for variant in changed:
+                variant.updated_at = now
+            ProductVariant.objects.bulk_update(changed, ['color', 'size', 'quantity', 'updated_at'])
+        if created:
+            ProductVariant.objects.bulk_create(created)
+
+    def _sync_images(self, instance, images_data, colors_data):
+        existing = {}
+        for image in instance.images.all():
+            existing.setdefault(image.content_hash, []).append(image)
+
+        kept, changed, created = set(), [], []
+        for i, image_data in enumerate(images_data):
+            color = colors_data[i] if i < len(colors_data) else None
+            digest = content_hash(image_data)
+            matches = existing.get(digest) if digest else None
+            if matches:
+                image = matches.pop(0)
+                kept.add(image.id)
+                if image.color != color:
+                    image.color = color
+                    changed.append(image)
+            else:
+                created.append(ProductImage(product=instance, image=image_data, color=color, content_hash=digest))
+
+        stale = [image.id for images in existing.values() for image in images if image.id not in kept]
+        if stale:
+            ProductImage.objects.filter(id__in=stale).delete()
+        if changed:
+            ProductImage.objects.bulk_update(changed, ['color'])
+        if created:
+            images = ProductImage.objects.bulk_create(created)
+            schedule_derivatives([image.id for image in images])
     
 
 
@@ -184,34 +357,10 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'product_variant', 'sale_price']
 
     def validate(self, data):
-        product_name = data.get('product_name')
-        color = data.get('color')
-        size = data.get('size')
-        quantity = data.get('quantity', 1)
-
-        try:
-            product = Product.objects.get(name__iexact=product_name)
-            product_variant = ProductVariant.objects.get(
-                product=product,
-                color__iexact=color,
-                size__iexact=size
-            )
-            if quantity > product_variant.quantity:
-                raise serializers.ValidationError({
-                    "quantity": f"Out of Stock: Only {product_variant.quantity} items available for {product_name} ({color}, {size})."
-                })
-            data['product_variant'] = product_variant
-            data['sale_price'] = product.sale_price
-            data['purchase_price'] = product.purchase_price
-        except Product.DoesNotExist:
-            raise serializers.ValidationError({"product_name": "Product with this name does not exist."})
-        except Product.MultipleObjectsReturned:
-            raise serializers.ValidationError({"product_name": "Multiple products found with this name. Please be more specific."})
-        except ProductVariant.DoesNotExist:
-            raise serializers.ValidationError({"color": f"No variant found for {product_name} with color {color} and size {size}."})
-        except ProductVariant.MultipleObjectsReturned:
-            raise serializers.ValidationError({"color": "Multiple variants found for this product, color, and size combination."})
-
+        # Variant lookup and stock checks happen for all lines at once in
+        # OrderSerializer.validate_items.
+        if data.get('quantity', 1) < 1:
+            raise serializers.ValidationError({"quantity": "Quantity must be at least 1."})
         return data
 
     def to_representation(self, instance):
@@ -224,7 +373,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_first_name = serializers.CharField(write_only=True, required=False)
     user = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all(), required=False)
     items = OrderItemSerializer(many=True, required=True)
@@ -235,14 +384,92 @@ class OrderSerializer(serializers.ModelSerializer):
     coupon_code = serializers.CharField(write_only=True, required=False)
     applied_coupon = serializers.CharField(source='coupon_code', read_only=True)
 
+    expandable_fields = ('user',)
+    column_map = {
+        'user_first_name': ['user', 'user__first_name'],
+        'applied_coupon': ['coupon_code'],
+    }
+    expand_column_map = {'user': ['user', 'user__first_name', 'user__last_name', 'user__email']}
+    select_map = {'user_first_name': ['user']}
+    prefetch_map = {'items': ['items__product_variant__product']}
+
     class Meta:
         model = Order
         fields = [
             'id', 'user', 'user_first_name', 'items', 'status',
             'cart_total', 'delivery_fee', 'total_price', 'shipping_info',
-            'created_at', 'updated_at', 'coupon_code', 'applied_coupon'
+            'created_at', 'updated_at', 'coupon_code', 'applied_coupon',
+            'item_count', 'original_cart_total', 'coupon_discount'
+        ]
+        read_only_fields = [
+            'id', 'user', 'created_at', 'updated_at', 'applied_coupon',
+            'item_count', 'original_cart_total', 'coupon_discount'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'applied_coupon']
+
+    def validate_items(self, items):
+        """
+        Resolve every (product_name, color, size) line to its variant with a
+        single query and check stock in memory, so the query count does not
+        grow with the number of lines.
+        """
+        def key(item):
+            return (item['product_name'].lower(), item['color'].lower(), item['size'].lower())
+
+        condition = Q()
+        for name, color, size in {key(item) for item in items}:
+            condition |= Q(product__name__iexact=name, color__iexact=color, size__iexact=size)
+        matches = defaultdict(list)
+        for variant in ProductVariant.objects.select_related('product').filter(condition):
+            matches[(variant.product.name.lower(), variant.color.lower(), variant.size.lower())].append(variant)
+
+        missing = [key(item) for item in items if key(item) not in matches]
+        known_products = set()
+        if missing:
+            product_condition = Q()
+            for name, _, _ in missing:
+                product_condition |= Q(name__iexact=name)
+            known_products = {name.lower() for name in Product.objects.filter(product_condition).values_list('name', flat=True)}
+
+        available = {}
+        if self.instance:
+            # Stock already held by this order is available to its new items.
+            for variant_id, quantity in self.instance.items.values_list('product_variant_id', 'quantity'):
+                available[variant_id] = available.get(variant_id, 0) + quantity
+
+        errors = [{} for _ in items]
+        for i, item in enumerate(items):
+            product_name, color, size = item['product_name'], item['color'], item['size']
+            variants = matches.get(key(item), [])
+            if not variants:
+                if key(item)[0] in known_products:
+                    errors[i] = {"color": f"No variant found for {product_name} with color {color} and size {size}."}
+                else:
+                    errors[i] = {"product_name": "Product with this name does not exist."}
+                continue
+            if len({v.product_id for v in variants}) > 1:
+                errors[i] = {"product_name": "Multiple products found with this name. Please be more specific."}
+                continue
+            if len(variants) > 1:
+                errors[i] = {"color": "Multiple variants found for this product, color, and size combination."}
+                continue
+
+            product_variant = variants[0]
+            remaining = available.setdefault(product_variant.id, 0) + product_variant.quantity
+            quantity = item.get('quantity', 1)
+            if quantity > remaining:
+                errors[i] = {
+                    "quantity": f"Out of Stock: Only {remaining} items available for {product_name} ({color}, {size})."
+                }
+                continue
+            available[product_variant.id] -= quantity
+
+            item['product_variant'] = product_variant
+            item['sale_price'] = product_variant.product.sale_price
+            item['purchase_price'] = product_variant.product.purchase_price
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
 
     def validate(self, data):
         logger.info(f"Validating order data: {data}")
@@ -299,6 +526,7 @@ class OrderSerializer(serializers.ModelSerializer):
                     item_price = data['items'][0].get('sale_price', 0)
                     coupon_discount = min(Decimal(item_price), coupon_discount)
                     data['cart_total'] = max(Decimal('0.00'), cart_total - coupon_discount)
+                data['coupon_discount'] = coupon_discount
 
             if data.get('total_price') != data['cart_total'] + delivery_fee:
                 raise serializers.ValidationError({"total_price": "Total price must be cart_total + delivery_fee."})
@@ -315,33 +543,38 @@ class OrderSerializer(serializers.ModelSerializer):
         if input_coupon_code:
             validated_data['coupon_code'] = input_coupon_code
 
-        order = Order.objects.create(**validated_data)
+        with transaction.atomic():
+            if input_coupon_code:
+                used = Coupon.objects.filter(code=input_coupon_code, user=user, is_used=False).update(
+                    is_used=True, used_at=timezone.now()
+                )
+                if not used:
+                    raise serializers.ValidationError({"coupon_code": "Invalid or already used coupon code."})
 
-        for item_data in items_data:
-            product_variant = item_data.pop('product_variant')
-            quantity = item_data.get('quantity', 1)
-            product_variant.quantity -= quantity
-            if product_variant.quantity < 0:
-                raise serializers.ValidationError({
-                    "quantity": f"Out of Stock: {product_variant.product.name} ({product_variant.color}, {product_variant.size}) has no stock left."
-                })
-            product_variant.save()
-
-            item_data.pop('product_name', None)
-            item_data.pop('color', None)
-            item_data.pop('size', None)
-            item_data['purchase_price'] = product_variant.product.purchase_price
-            OrderItem.objects.create(order=order, product_variant=product_variant, **item_data)
+            validated_data['item_count'] = sum(item.get('quantity', 1) for item in items_data)
+            validated_data['original_cart_total'] = sum(
+                (item['sale_price'] * item.get('quantity', 1) for item in items_data), Decimal('0.00')
+            )
+            order = Order.objects.create(**validated_data)
 
-        if input_coupon_code:
-            try:
-                coupon = Coupon.objects.get(code=input_coupon_code, user=user, is_used=False)
-                coupon.is_used = True
-                coupon.used_at = timezone.now()
-                coupon.save()
-            except Coupon.DoesNotExist:
-                pass
+            reserved = defaultdict(int)
+            order_items = []
+            for item_data in items_data:
+                product_variant = item_data.pop('product_variant')
+                reserved[product_variant.id] += item_data.get('quantity', 1)
 
+                item_data.pop('product_name', None)
+                item_data.pop('color', None)
+                item_data.pop('size', None)
+                item_data['purchase_price'] = product_variant.product.purchase_price
+                order_items.append(OrderItem(order=order, product_variant=product_variant, **item_data))
+
+            apply_stock_deltas(reserved)
+            OrderItem.objects.bulk_create(order_items)
+            if order.status == 'delivered':
+                rollups.apply_change(({}, {}), rollups.snapshot([order.id]))
+
+        prefetch_related_objects([order], 'items__product_variant__product')
         return order
 
     def update(self, instance, validated_data):
@@ -351,77 +584,101 @@ class OrderSerializer(serializers.ModelSerializer):
         validated_data.pop('coupon_code', None)
         new_status = validated_data.get('status', instance.status)
         old_status = instance.status  
-        instance.status = new_status
-        instance.cart_total = validated_data.get('cart_total', instance.cart_total)
-        instance.delivery_fee = validated_data.get('delivery_fee', instance.delivery_fee)
-        instance.total_price = validated_data.get('total_price', instance.total_price)
-        instance.shipping_info = validated_data.get('shipping_info', instance.shipping_info)
-        instance.save()
-
-        user = instance.user
-        logger.info(f"Order {instance.id} status changed from {old_status} to {new_status}")
-
-        if new_status == 'delivered' and old_status != 'delivered' and not instance.coupon_code:
-            logger.info(f"Awarding 70 points to user {user.id} for order {instance.id}")
-            user.points += 70
-            user.save()
-
-            if user.points >= 500:
-                logger.info(f"Generating coupon for user {user.id} with points {user.points}")
-                new_coupon_code = f"OS-{uuid.uuid4().hex[:2].upper()}"
-                Coupon.objects.create(user=user, code=new_coupon_code, value=500)
-                user.points = 0
-                user.save()
-        elif old_status == 'delivered' and new_status != 'delivered':
-            logger.info(f"Deducting 70 points from user {user.id} for order {instance.id}")
-            user.points = max(0, user.points - 70)
-            user.save()
-
-        if items_data:
-            old_items = {item.id: item for item in instance.items.all()}
-            for old_item in old_items.values():
-                old_item.product_variant.quantity += old_item.quantity
-                old_item.product_variant.save()
-
-            instance.items.all().delete()
+        # Only delivered orders count towards the daily rollups.
+        affects_rollups = 'delivered' in (old_status, new_status)
+        with transaction.atomic(), (rollups.track_orders([instance.id]) if affects_rollups else nullcontext()):
+            instance.status = new_status
+            instance.cart_total = validated_data.get('cart_total', instance.cart_total)
+            instance.delivery_fee = validated_data.get('delivery_fee', instance.delivery_fee)
+            instance.total_price = validated_data.get('total_price', instance.total_price)
+            instance.shipping_info = validated_data.get('shipping_info', instance.shipping_info)
+            instance.save()
+
+            logger.info(f"Order {instance.id} status changed from {old_status} to {new_status}")
+            publish_status_changes([(instance.user_id, old_status, new_status, instance.coupon_code)])
+
+            if items_data:
+                self._sync_items(instance, items_data)
+
+        prefetch_related_objects([instance], 'items__product_variant__product')
+        logger.info(f"Order {instance.id} updated successfully")
+        return instance
 
-            for item_data in items_data:
-                product_variant = item_data.pop('product_variant')
-                quantity = item_data.get('quantity', 1)
-
-                matching_old_item = None
-
-                for old_item in old_items.values():
-                    if (old_item.product_variant.product.name.lower() == item_data.get('product_name', '').lower() and
-                        old_item.product_variant.color.lower() == item_data.get('color', '').lower() and
-                        old_item.product_variant.size.lower() == item_data.get('size', '').lower()):
-                        matching_old_item = old_item
-                        break
-                
-                if not matching_old_item or quantity > matching_old_item.quantity:
-                    available_quantity = product_variant.quantity
-                    if matching_old_item:
-                        available_quantity += matching_old_item.quantity
-                    if quantity > available_quantity:
-                        raise serializers.ValidationError({
-                            "quantity": f"Out of Stock: Only {available_quantity} items available for {product_variant.product.name} ({product_variant.color}, {product_variant.size})."
-                        })
-
-                product_variant.quantity -= quantity
-                product_variant.save()
+    def _sync_items(self, instance, items_data):
+        """
+        Replace the order's lines with `items_data`, touching only what changed.
 
-                item_data.pop('product_name', None)
-                item_data.pop('color', None)
-                item_data.pop('size', None)
-                item_data['purchase_price'] = product_variant.product.purchase_price
-                OrderItem.objects.create(order=instance, product_variant=product_variant, **item_data)
+        Lines are matched to the existing ones by variant id. Matched lines keep
+        their row and the prices they were sold at, stock moves by the net
+        difference per variant in one conditional UPDATE, and the rest is a
+        single delete, bulk_update and bulk_create.
+        """
+        existing = defaultdict(list)
+        for item in instance.items.order_by('id'):
+            existing[item.product_variant_id].append(item)
 
-        logger.info(f"Order {instance.id} updated successfully, user points: {user.points}")
-        return instance
+        incoming = defaultdict(list)
+        for item_data in items_data:
+            incoming[item_data['product_variant'].id].append(item_data)
+
+        deltas = defaultdict(int)
+        changed, created, removed, kept = [], [], [], []
+        for variant_id in existing.keys() | incoming.keys():
+            old_items, new_lines = existing.get(variant_id, []), incoming.get(variant_id, [])
+            deltas[variant_id] = (
+                sum(line.get('quantity', 1) for line in new_lines) - sum(item.quantity for item in old_items)
+            )
+            for item, line in zip(old_items, new_lines):
+                kept.append(item)
+                if item.quantity != line.get('quantity', 1):
+                    item.quantity = line.get('quantity', 1)
+                    changed.append(item)
+            removed.extend(item.id for item in old_items[len(new_lines):])
+            for line in new_lines[len(old_items):]:
+                created.append(OrderItem(
+                    order=instance,
+                    product_variant=line['product_variant'],
+                    quantity=line.get('quantity', 1),
+                    sale_price=line['sale_price'],
+                    purchase_price=line['purchase_price'],
+                ))
+
+        apply_stock_deltas(deltas)
+        if removed:
+            OrderItem.objects.filter(id__in=removed).delete()
+        if changed:
+            OrderItem.objects.bulk_update(changed, ['quantity'])
+        if created:
+            OrderItem.objects.bulk_create(created)
+
+        # Created lines get higher ids than kept ones, so this is id order.
+        items = sorted(kept, key=lambda item: item.id) + created
+        instance.item_count = sum(item.quantity for item in items)
+        instance.original_cart_total = sum((item.sale_price * item.quantity for item in items), Decimal('0.00'))
+        # The coupon covers the first line up to its value, as at checkout.
+        instance.coupon_discount = Decimal('0.00')
+        if instance.coupon_code and items:
+            coupon = Coupon.objects.filter(code=instance.coupon_code).first()
+            if coupon is not None:
+                instance.coupon_discount = min(coupon.value, items[0].sale_price)
+        instance.save(update_fields=['item_count', 'original_cart_total', 'coupon_discount', 'updated_at'])
+
+    @classmethod
+    def readable_fields(cls):
+        return super().readable_fields() + ('user_first_name',)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['user_first_name'] = instance.user.first_name
+        if self.requested_fields is None or 'user_first_name' in self.requested_fields:
+            representation['user_first_name'] = instance.user.first_name
+        if 'user' in self.expand and 'user' in representation:
+            user = instance.user
+            representation['user'] = {
+                'id': user.id,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+                'email': user.email,
+            }
         return representation
 
 
@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import search
+from .catalog_cache import catalog_changed, forget_catalog_admin
+from .models import CustomUser, Order, Product, ProductVariant, ProductImage
+from .prefix_index import user_index, product_index, user_payload, product_payload
+from .sync import record_deletion
+from .rollups import snapshot, apply_change
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_catalog(sender, instance, **kwargs):
+    catalog_changed()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    search.schedule_reindex(instance.id)
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def reindex_variant_product(sender, instance, **kwargs):
+    search.schedule_reindex(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def update_product_prefix_index(sender, instance, **kwargs):
+    payload = product_payload(instance)
+    transaction.on_commit(lambda: product_index.upsert(instance.id, instance.name, payload))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_prefix_index(sender, instance, **kwargs):
+    product_id = instance.id  # Django clears instance.id once the delete is done.
+    transaction.on_commit(lambda: product_index.remove(product_id))
+
+
+@receiver(post_save, sender=CustomUser)
+def update_user_prefix_index(sender, instance, **kwargs):
+    payload = user_payload(instance)
+    transaction.on_commit(lambda: user_index.upsert(instance.id, instance.first_name, payload))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def forget_user_admin_flag(sender, instance, **kwargs):
+    user_id = instance.id  # Django clears instance.id once the delete is done.
+    transaction.on_commit(lambda: forget_catalog_admin(user_id))
+
+
+@receiver(post_delete, sender=CustomUser)
+def remove_user_prefix_index(sender, instance, **kwargs):
+    user_id = instance.id  # Django clears instance.id once the delete is done.
+    transaction.on_commit(lambda: user_index.remove(user_id))
+
+
+@receiver(post_delete, sender=Order)
+def record_order_deletion(sender, instance, **kwargs):
+    record_deletion('order', instance.id)
+
+
+@receiver(pre_delete, sender=Order)
+def snapshot_delivered_order(sender, instance, **kwargs):
+    # Items are still there before the delete cascades to them.
+    if instance.status == 'delivered':
+        instance._rollup_snapshot = snapshot([instance.id])
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    if hasattr(instance, '_rollup_snapshot'):
+        apply_change(instance._rollup_snapshot, ({}, {}))
+
+
+@receiver(post_delete, sender=Product)
+def record_product_deletion(sender, instance, **kwargs):
+    record_deletion('product', instance.id)
+
+
+@receiver(post_delete, sender=CustomUser)
+def record_user_deletion(sender, instance, **kwargs):
+    record_deletion('user', instance.id)
+
+
+@receiver(post_delete, sender=ProductVariant)
+def touch_variant_product(sender, instance, **kwargs):
+    # A removed variant leaves no row behind to sync, so mark the product changed.
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# products/ab/<sha256>.png and products/derivatives/<sha256>_card.webp
+IMMUTABLE_MEDIA_RE = r'products/(?:[0-9a-f]{2}/[0-9a-f]{64}|derivatives/[0-9a-f]{64}_\w+)\.\w+'
+
+
+def content_hash(file):
+    """SHA-256 hex digest of an uploaded or stored file, leaving it rewound."""
+    digest = hashlib.sha256()
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    for chunk in file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(65536), b''):
+        digest.update(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible(path='api.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that names every file after the SHA-256 of its bytes.
+
+    Saving bytes that are already stored returns the existing name without
+    writing anything (it only refreshes the file's mtime), so the same photo
+    uploaded for several colors is kept once. Since a name can never point at different bytes, the URLs can be
+    cached indefinitely (see IMMUTABLE_MEDIA_RE).
+    """
+
+    def __init__(self, *args, prefix='products', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefix = prefix
+
+    def hashed_name(self, name, digest):
+        extension = os.path.splitext(name)[1].lower()
+        return f"{self.prefix}/{digest[:2]}/{digest}{extension}"
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content_hash(content))
+        if self.exists(name):
+            # Touch the reused file so gc_media's age check treats it as a
+            # fresh upload until the row pointing at it has committed.
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        return super().save(name, content, max_length=max_length)
+
+
+def is_immutable_media(name):
+    return re.fullmatch(IMMUTABLE_MEDIA_RE, name) is not None
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import CustomUser, Order, Product, ProductVariant, Tombstone
+
+
+def _changed_orders(queryset, since):
+    return queryset.filter(updated_at__gte=since)
+
+
+def _changed_products(queryset, since):
+    # Stock moves only touch the variant rows, so those count as a product change too.
+    variants = ProductVariant.objects.filter(updated_at__gte=since).values('product_id')
+    return queryset.filter(Q(updated_at__gte=since) | Q(id__in=variants))
+
+
+def _changed_users(queryset, since):
+    return queryset.filter(updated_at__gte=since)
+
+
+# resource -> (tombstone model name, model, changed-rows filter)
+SYNC_RESOURCES = {
+    'orders': ('order', Order, _changed_orders),
+    'products': ('product', Product, _changed_products),
+    'users': ('user', CustomUser, _changed_users),
+}
+
+
+def record_deletion(model_name, object_id):
+    Tombstone.objects.create(model_name=model_name, object_id=object_id)
+
+
+def parse_watermark(value):
+    if not value:
+        return None
+    since = parse_datetime(value.replace(' ', '+'))
+    if since is None:
+        raise ValidationError({'updated_since': "Invalid timestamp. Use the watermark returned by the previous sync."})
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def sync_window(since):
+    """
+    Return (now, next watermark, whether a full resync is needed).
+
+    The next watermark is taken before any rows are read and pulled back by
+    SYNC_WATERMARK_OVERLAP, so a write that commits while this request runs
+    is sent again next time instead of being missed. Clients that have been
+    away longer than the tombstone retention get the full dataset again.
+    """
+    now = timezone.now()
+    watermark = now - timedelta(seconds=settings.SYNC_WATERMARK_OVERLAP)
+    full = since is None or since < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    return now, watermark, full
+
+
+def changed_since(resource, queryset, since):
+    _, _, changed = SYNC_RESOURCES[resource]
+    return changed(queryset, since).order_by('updated_at', 'id')
+
+
+def deleted_since(resource, since):
+    model_name, _, _ = SYNC_RESOURCES[resource]
+    return list(
+        Tombstone.objects.filter(model_name=model_name, deleted_at__gte=since)
+        .order_by('deleted_at').values_list('object_id', flat=True)
+    )
+
+
+def prune_tombstones(now):
+    cutoff = now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
@@ -1,3 +1,999 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import outbox
+from .idempotency import purge_expired_keys
+from .inventory import apply_stock_deltas
+from .loyalty import POINTS_PER_ORDER, new_coupon_codes
+from .management.commands import gc_media
+from .models import (
+    Coupon, CustomUser, IdempotencyKey, Order, OrderItem, OutboxEvent, Product, ProductDailySales, ProductImage,
+    ProductVariant, Report, VisitorLog
+)
+from .prefix_index import WARM_UP_UID, product_index, user_index, warm_prefix_indexes
+from .rollups import rebuild_rollups
+from .search import rebuild_index
+
+
+def make_user(email='admin@example.com', is_staff=True):
+    return CustomUser.objects.create_user(
+        username=email, email=email, password='Secret123!', is_staff=is_staff, first_name='Test'
+    )
+
+
+def client_for(user):
+    client = APIClient()
+    client.cookies['access_token'] = str(RefreshToken.for_user(user).access_token)
+    return client
+
+
+def order_payload(items, delivery_fee=40):
+    cart_total = sum(Decimal(str(item['sale_price'])) * item['quantity'] for item in items)
+    return {
+        'items': items,
+        'cart_total': str(cart_total),
+        'delivery_fee': delivery_fee,
+        'total_price': str(cart_total + delivery_fee),
+        'shipping_info': {'fullName': 'Test', 'address': 'Street 1', 'phone': '0100', 'governorate': 'Cairo'},
+    }
+
+
+def line(name, color, size, quantity, sale_price):
+    return {'product_name': name, 'color': color, 'size': size, 'quantity': quantity, 'sale_price': sale_price}
+
+
+def use_temporary_media(test):
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVE_WORKERS=0)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+def png(name, color):
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+# Background index builds could not see the rows of the test transaction.
+@override_settings(PREFIX_INDEX_BACKGROUND_BUILDS=False)
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.client = client_for(self.user)
+        self.tee = Product.objects.create(name='Tee', purchase_price=40, sale_price=100)
+        self.cap = Product.objects.create(name='Cap', purchase_price=10, sale_price=30)
+        self.red_tee = ProductVariant.objects.create(product=self.tee, color='Red', size='M', quantity=5)
+        self.blue_cap = ProductVariant.objects.create(product=self.cap, color='Blue', size='L', quantity=2)
+
+    def create_order(self, items, **extra):
+        return self.client.post('/api/orders/', order_payload(items), format='json', **extra)
+
+    def deliver(self, order_id):
+        response = self.client.patch(f'/api/orders/{order_id}/', {'status': 'delivered'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class CatalogPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(6):
+            product = Product.objects.create(name=f'Hoodie {number}', purchase_price=50, sale_price=120)
+            ProductVariant.objects.create(product=product, color='Black', size='M', quantity=3)
+            ProductVariant.objects.create(product=product, color='Grey', size='L', quantity=1)
+        self.anonymous = APIClient()
+
+    def test_cursor_pages_cover_the_catalog_newest_first(self):
+        ids, params = [], {'page_size': 3}
+        while True:
+            response = self.anonymous.get('/api/products/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            ids += [product['id'] for product in response.data['results']]
+            if response.data['next_cursor'] is None:
+                break
+            params = {'page_size': 3, 'cursor': response.data['next_cursor']}
+        self.assertEqual(ids, sorted(Product.objects.values_list('id', flat=True), reverse=True))
+        self.assertEqual(len(response.data['results'][0]['variants']), 1)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        counts = []
+        for page_size in (2, 8):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.anonymous.get('/api/products/', {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.anonymous.get('/api/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.anonymous = APIClient()
+
+    def test_unchanged_catalog_answers_304(self):
+        response = self.anonymous.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('must-revalidate', response['Cache-Control'])
+        etag = response['ETag']
+
+        response = self.anonymous.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # The detail view and the admin representation get their own tags.
+        self.assertNotEqual(self.anonymous.get(f'/api/products/{self.tee.id}/')['ETag'], etag)
+        self.assertNotEqual(self.client.get('/api/products/')['ETag'], etag)
+
+    def test_catalog_writes_change_the_etag(self):
+        etag = self.anonymous.get('/api/products/')['ETag']
+        writes = [
+            lambda: Product.objects.create(name='Scarf', purchase_price=5, sale_price=15),
+            lambda: ProductVariant.objects.create(product=self.tee, color='Red', size='L', quantity=1),
+            lambda: self.blue_cap.delete(),
+        ]
+        for write in writes:
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            response = self.anonymous.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+        self.assertIn('Scarf', [product['name'] for product in response.data])
+
+
+class ProductUpdateTests(CatalogTestCase):
+    def put(self, **data):
+        response = self.client.put(f'/api/products/{self.tee.id}/', data, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def variants(self):
+        return {
+            (v.color, v.size): (v.id, v.quantity) for v in ProductVariant.objects.filter(product=self.tee)
+        }
+
+    def test_variants_are_diffed_by_color_and_size(self):
+        self.put(**{'variants[]': [
+            json.dumps({'color': 'Red', 'size': 'M', 'quantity': 7}),
+            json.dumps({'color': 'Blue', 'size': 'S', 'quantity': 2}),
+        ]})
+        variants = self.variants()
+        self.assertEqual(variants[('Red', 'M')], (self.red_tee.id, 7))
+        self.assertEqual(variants[('Blue', 'S')][1], 2)
+        blue_id = variants[('Blue', 'S')][0]
+
+        self.create_order([line('Tee', 'Red', 'M', 1, 100)])
+        self.put(**{'variants[]': [json.dumps({'color': 'blue', 'size': 's', 'quantity': 3})]})
+        # The ordered red variant is emptied rather than deleted with its order lines.
+        self.assertEqual(self.variants(), {('Red', 'M'): (self.red_tee.id, 0), ('blue', 's'): (blue_id, 3)})
+        self.assertEqual(OrderItem.objects.get().product_variant_id, self.red_tee.id)
+
+    def test_unordered_variants_are_deleted(self):
+        self.put(**{'variants[]': [json.dumps({'color': 'Green', 'size': 'XL', 'quantity': 1})]})
+        self.assertEqual(list(self.variants()), [('Green', 'XL')])
+
+    def test_images_are_matched_by_content(self):
+        use_temporary_media(self)
+        self.put(images=[png('a.png', 'red'), png('b.png', 'blue')], image_colors=['Red', 'Blue'])
+        before = dict(ProductImage.objects.values_list('content_hash', 'id'))
+        self.assertEqual(len(before), 2)
+
+        # Same bytes under new file names keep their rows; the dropped image goes.
+        self.put(images=[png('c.png', 'red')], image_colors=['Dark Red'])
+        image = ProductImage.objects.get()
+        self.assertEqual(image.id, before[image.content_hash])
+        self.assertEqual(image.color, 'Dark Red')
+
+
+class CatalogFilterTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        Product.objects.filter(pk=self.tee.pk).update(category='Tops')
+        Product.objects.filter(pk=self.cap.pk).update(category='Hats')
+        ProductVariant.objects.create(product=self.tee, color='Blue', size='L', quantity=0)
+        ProductVariant.objects.filter(pk=self.blue_cap.pk).update(quantity=0)
+        self.anonymous = APIClient()
+
+    def names(self, **params):
+        response = self.anonymous.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(product['name'] for product in response.data)
+
+    def test_filters(self):
+        self.assertEqual(self.names(category='Hats'), ['Cap'])
+        self.assertEqual(self.names(category='Hats,Tops'), ['Cap', 'Tee'])
+        self.assertEqual(self.names(color='Blue'), ['Cap', 'Tee'])
+        self.assertEqual(self.names(min_price='50'), ['Tee'])
+        self.assertEqual(self.names(max_price='50'), ['Cap'])
+        self.assertEqual(self.names(in_stock='1'), ['Tee'])
+        # Color, size and stock must hold for the same variant.
+        self.assertEqual(self.names(color='Red', size='L'), [])
+        self.assertEqual(self.names(color='Blue', in_stock='1'), [])
+
+    def test_invalid_price_is_rejected(self):
+        self.assertEqual(self.anonymous.get('/api/products/', {'min_price': 'cheap'}).status_code, 400)
+
+    def test_facets(self):
+        response = self.anonymous.get('/api/products/', {'facets': '1', 'color': 'Red'})
+        self.assertEqual([product['name'] for product in response.data['results']], ['Tee'])
+        facets = response.data['facets']
+        self.assertEqual(facets['categories'], [{'value': 'Hats', 'count': 1}, {'value': 'Tops', 'count': 1}])
+        self.assertEqual(facets['colors'], [{'value': 'Blue', 'count': 2}, {'value': 'Red', 'count': 1}])
+        self.assertEqual(facets['sizes'], [{'value': 'L', 'count': 2}, {'value': 'M', 'count': 1}])
+        self.assertEqual(facets['in_stock'], 1)
+        self.assertEqual(facets['price'], {'min': 30.0, 'max': 100.0})
+
+
+class OrderListTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        ProductVariant.objects.filter(pk=self.red_tee.pk).update(quantity=50)
+        self.customer = make_user('customer@example.com', is_staff=False)
+        now = timezone.now()
+        self.orders = []
+        for days_ago, governorate, fee in [(0, 'Cairo', 40), (1, 'Alexandria', 50), (1, 'Giza', 70), (10, 'Cairo', 40)]:
+            payload = order_payload([line('Tee', 'Red', 'M', 1, 100)], delivery_fee=fee)
+            payload['shipping_info']['governorate'] = governorate
+            response = self.client.post('/api/orders/', payload, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+            Order.objects.filter(pk=response.data['id']).update(created_at=now - timedelta(days=days_ago))
+            self.orders.append(response.data['id'])
+        Order.objects.filter(pk=self.orders[1]).update(status='delivered', user=self.customer)
+
+    def ids(self, **params):
+        response = self.client.get('/api/orders/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(order['id'] for order in response.data)
+
+    def test_keyset_pages_are_newest_first(self):
+        ids, params = [], {'page_size': 3}
+        while True:
+            response = self.client.get('/api/orders/', params)
+            ids += [order['id'] for order in response.data['results']]
+            if response.data['next_cursor'] is None:
+                break
+            params = {'page_size': 3, 'cursor': response.data['next_cursor']}
+        # Two orders share a day; the tie is broken by id.
+        self.assertEqual(ids, [self.orders[0], self.orders[2], self.orders[1], self.orders[3]])
+
+    def test_filters(self):
+        today = timezone.localdate()
+        self.assertEqual(self.ids(status='delivered'), [self.orders[1]])
+        self.assertEqual(self.ids(status='pending,delivered'), self.orders)
+        self.assertEqual(self.ids(governorate='Giza'), [self.orders[2]])
+        self.assertEqual(self.ids(user=self.customer.id), [self.orders[1]])
+        self.assertEqual(
+            self.ids(date_from=(today - timedelta(days=1)).isoformat(), date_to=today.isoformat()), self.orders[:3]
+        )
+        self.assertEqual(self.ids(date_to=(today - timedelta(days=2)).isoformat()), [self.orders[3]])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'status': 'lost'}, {'date_from': '18/10/2026'}, {'user': 'me'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/orders/', params).status_code, 400)
+
+
+class OrderExportTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_order([line('Tee', 'Red', 'M', 2, 100), line('Cap', 'Blue', 'L', 1, 30)]).data['id']
+        self.second = self.create_order([line('Tee', 'Red', 'M', 1, 100)]).data['id']
+        Order.objects.filter(pk=self.first).update(created_at=timezone.now() - timedelta(days=3))
+
+    def export(self, **params):
+        response = self.client.get('/api/orders/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_has_one_row_per_item(self):
+        response, content = self.export()
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(
+            [(int(row['order_id']), row['product'], row['quantity']) for row in rows],
+            [(self.first, 'Tee', '2'), (self.first, 'Cap', '1'), (self.second, 'Tee', '1')]
+        )
+        self.assertEqual(rows[0]['governorate'], 'Cairo')
+        self.assertEqual(rows[0]['purchase_price'], '40.00')
+
+    def test_ndjson_has_one_line_per_order_and_honours_the_date_range(self):
+        today = timezone.localdate().isoformat()
+        _, content = self.export(file_format='ndjson', date_from=today, date_to=today)
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([record['order_id'] for record in records], [self.second])
+        self.assertEqual(records[0]['items'][0]['product'], 'Tee')
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get('/api/orders/export/', {'file_format': 'xlsx'}).status_code, 400)
+
+    def test_command_writes_the_same_rows(self):
+        _, content = self.export()
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir, ignore_errors=True)
+        path = os.path.join(output_dir, 'orders.csv')
+        call_command('export_orders', path, '--chunk-size', '1', stdout=StringIO())
+        with open(path, encoding='utf-8', newline='') as f:
+            self.assertEqual(f.read(), content)
+
+
+class StockReservationTests(CatalogTestCase):
+    def stock(self):
+        return dict(ProductVariant.objects.values_list('id', 'quantity'))
+
+    def test_order_takes_stock(self):
+        response = self.create_order([line('Tee', 'Red', 'M', 2, 100), line('Cap', 'Blue', 'L', 1, 30)])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.stock(), {self.red_tee.id: 3, self.blue_cap.id: 1})
+
+    def test_oversell_is_rejected_and_nothing_is_written(self):
+        before = self.stock()
+        # The tee line alone would fit; the cap line is short, so the whole order must roll back.
+        response = self.create_order([line('Tee', 'Red', 'M', 2, 100), line('Cap', 'Blue', 'L', 3, 30)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Only 2 items available', str(response.data))
+        self.assertEqual(self.stock(), before)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_edit_beyond_stock_keeps_the_order_unchanged(self):
+        order_id = self.create_order([line('Cap', 'Blue', 'L', 1, 30)]).data['id']
+        response = self.client.patch(
+            f'/api/orders/{order_id}/', {'items': [line('Cap', 'Blue', 'L', 4, 30)]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Out of Stock', str(response.data))
+        self.assertEqual(self.stock()[self.blue_cap.id], 1)
+        self.assertEqual(list(OrderItem.objects.values_list('quantity', flat=True)), [1])
+
+    def test_conditional_update_is_all_or_nothing(self):
+        # Bypasses the serializer checks, as a concurrent order would.
+        with self.assertRaises(ValidationError) as raised:
+            apply_stock_deltas({self.red_tee.id: 2, self.blue_cap.id: 3})
+        self.assertIn('Cap', str(raised.exception.detail))
+        self.assertEqual(self.stock(), {self.red_tee.id: 5, self.blue_cap.id: 2})
+
+        apply_stock_deltas({self.red_tee.id: 5, self.blue_cap.id: -1})
+        self.assertEqual(self.stock(), {self.red_tee.id: 0, self.blue_cap.id: 3})
+
+
+class IdempotentOrderTests(CatalogTestCase):
+    def test_retry_replays_the_first_response(self):
+        items = [line('Tee', 'Red', 'M', 1, 100)]
+        first = self.create_order(items, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        retry = self.create_order(items, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(ProductVariant.objects.get(pk=self.red_tee.pk).quantity, 4)
+
+    def test_different_payload_with_same_key_is_rejected(self):
+        self.create_order([line('Tee', 'Red', 'M', 1, 100)], HTTP_IDEMPOTENCY_KEY='checkout-1')
+        response = self.create_order([line('Tee', 'Red', 'M', 2, 100)], HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_releases_the_key(self):
+        short = self.create_order([line('Cap', 'Blue', 'L', 3, 30)], HTTP_IDEMPOTENCY_KEY='checkout-2')
+        self.assertEqual(short.status_code, 400)
+        ProductVariant.objects.filter(pk=self.blue_cap.pk).update(quantity=3)
+        retry = self.create_order([line('Cap', 'Blue', 'L', 3, 30)], HTTP_IDEMPOTENCY_KEY='checkout-2')
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', retry)
+
+    def test_keys_are_per_user(self):
+        self.create_order([line('Tee', 'Red', 'M', 1, 100)], HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.client = client_for(make_user('other@example.com', is_staff=False))
+        response = self.create_order([line('Tee', 'Red', 'M', 1, 100)], HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_expired_key_can_be_reused(self):
+        items = [line('Tee', 'Red', 'M', 1, 100)]
+        first = self.create_order(items, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        second = self.create_order(items, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.data['id'], first.data['id'])
+        self.assertEqual(purge_expired_keys(), 0)
+
+
+class OutboxTests(CatalogTestCase):
+    def register(self, topic, func):
+        outbox.handler(topic)(func)
+        self.addCleanup(outbox._handlers.pop, topic, None)
+
+    def make_due(self):
+        OutboxEvent.objects.update(available_at=timezone.now())
+
+    def drain_failing(self):
+        with self.assertLogs('api.outbox', 'ERROR'):
+            return outbox.drain()
+
+    def test_delivery_points_are_settled_by_the_worker(self):
+        order_id = self.create_order([line('Tee', 'Red', 'M', 1, 100)]).data['id']
+        response = self.client.patch(f'/api/orders/{order_id}/', {'status': 'delivered'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.points, 0)
+
+        self.assertEqual(outbox.drain(), (1, 0))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.points, POINTS_PER_ORDER)
+        self.assertEqual(OutboxEvent.objects.get().status, 'done')
+        # Draining again must not award the points twice.
+        self.assertEqual(outbox.drain(), (0, 0))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.points, POINTS_PER_ORDER)
+
+    def test_rolled_back_transaction_publishes_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                outbox.publish('test.event', {})
+                raise RuntimeError('rollback')
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failed_event_is_retried_with_backoff(self):
+        calls = []
+
+        def flaky(payload):
+            calls.append(payload)
+            if len(calls) < 3:
+                raise RuntimeError('temporary')
+        self.register('test.flaky', flaky)
+        outbox.publish('test.flaky', {'n': 1})
+
+        self.assertEqual(self.drain_failing(), (0, 1))
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.status, event.attempts, event.last_error), ('pending', 1, 'temporary'))
+        self.assertGreater(event.available_at, timezone.now())
+        self.assertEqual(outbox.drain(), (0, 0))
+
+        self.make_due()
+        self.assertEqual(self.drain_failing(), (0, 1))
+        self.make_due()
+        self.assertEqual(outbox.drain(), (1, 0))
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts, event.last_error), ('done', 3, ''))
+        self.assertEqual(calls, [{'n': 1}] * 3)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_event_fails_for_good_after_max_attempts(self):
+        def broken(payload):
+            raise RuntimeError('permanent')
+        self.register('test.broken', broken)
+        outbox.publish('test.broken', {})
+
+        self.drain_failing()
+        self.make_due()
+        self.drain_failing()
+        self.make_due()
+        self.assertEqual(outbox.drain(), (0, 0))
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('failed', 2))
+
+    def test_handler_writes_roll_back_with_the_failure(self):
+        def half_done(payload):
+            CustomUser.objects.filter(pk=payload['user']).update(points=999)
+            raise RuntimeError('after write')
+        self.register('test.half_done', half_done)
+        outbox.publish('test.half_done', {'user': self.user.pk})
+        self.drain_failing()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.points, 0)
+
+    def test_stale_processing_event_is_reclaimed(self):
+        seen = []
+        self.register('test.stale', seen.append)
+        event = outbox.publish('test.stale', {'n': 1})
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            status='processing', attempts=1, locked_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(outbox.drain(), (1, 0))
+        self.assertEqual(seen, [{'n': 1}])
+
+
+class RollupTests(CatalogTestCase):
+    """The incrementally kept rollups must always equal a rebuild from the orders."""
+
+    def rollup_rows(self):
+        reports = sorted(
+            row for row in Report.objects.values_list(
+                'date', 'total_orders', 'total_sales', 'total_sales_with_delivery', 'total_profit'
+            )
+            if any(row[1:])
+        )
+        product_sales = sorted(ProductDailySales.objects.values_list(
+            'date', 'product_id', 'variant_id', 'quantity_sold', 'total_sale_price', 'total_purchase_price', 'total_profit'
+        ))
+        return reports, product_sales
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollup_rows())
+        return incremental
+
+    def test_rollups_follow_order_changes(self):
+        first = self.create_order([line('Tee', 'Red', 'M', 2, 100), line('Cap', 'Blue', 'L', 1, 30)]).data['id']
+        second = self.create_order([line('Cap', 'Blue', 'L', 1, 30)]).data['id']
+        self.assertEqual(self.assertMatchesRebuild(), ([], []))
+
+        self.deliver(first)
+        reports, product_sales = self.assertMatchesRebuild()
+        self.assertEqual([row[1:] for row in reports], [(1, Decimal('230.00'), Decimal('270.00'), Decimal('140.00'))])
+        self.assertEqual(len(product_sales), 2)
+
+        # Item edits on a delivered order move the figures with them.
+        response = self.client.patch(
+            f'/api/orders/{first}/', {'items': [line('Tee', 'Red', 'M', 1, 100)]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        reports, product_sales = self.assertMatchesRebuild()
+        self.assertEqual([row[3:] for row in product_sales], [(1, Decimal('100.00'), Decimal('40.00'), Decimal('60.00'))])
+
+        response = self.client.post(
+            '/api/orders/bulk-status/', {'ids': [first, second], 'status': 'delivered'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        reports, _ = self.assertMatchesRebuild()
+        self.assertEqual(reports[0][1], 2)
+
+        response = self.client.patch(f'/api/orders/{first}/', {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertMatchesRebuild()
+
+        response = self.client.delete(f'/api/orders/{second}/')
+        self.assertIn(response.status_code, (200, 204), response.content)
+        self.assertEqual(self.assertMatchesRebuild(), ([], []))
+
+    def test_deleting_a_customer_removes_their_sales(self):
+        customer = make_user('customer@example.com', is_staff=False)
+        self.client = client_for(customer)
+        order_id = self.create_order([line('Tee', 'Red', 'M', 1, 100)]).data['id']
+        self.client = client_for(self.user)
+        self.deliver(order_id)
+        self.assertNotEqual(self.assertMatchesRebuild(), ([], []))
+
+        customer.delete()
+        self.assertEqual(self.assertMatchesRebuild(), ([], []))
+
+
+class ReportTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order_ids = [self.create_order([line('Tee', 'Red', 'M', 1, 100)]).data['id'] for _ in range(3)]
+        for order_id in self.order_ids:
+            self.deliver(order_id)
+        self.today = timezone.localdate().isoformat()
+
+    def order_pages(self, url, params):
+        ids, cursor = [], None
+        while True:
+            page_params = dict(params, orders=1, page_size=2, **({'cursor': cursor} if cursor else {}))
+            response = self.client.get(url, page_params)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(response.data['total_orders'], 3)
+            ids += [order['order_id'] for order in response.data['orders']['results']]
+            cursor = response.data['orders']['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_daily_and_monthly_order_details_are_paginated(self):
+        today = timezone.localdate()
+        reports = [
+            ('/api/reports/daily/', {'date': self.today}),
+            ('/api/reports/monthly/', {'year': today.year, 'month': today.month}),
+            ('/api/reports/range/', {'from': self.today, 'to': self.today}),
+        ]
+        for url, params in reports:
+            with self.subTest(url=url):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('orders', response.data)
+                self.assertEqual(self.order_pages(url, params), self.order_ids[::-1])
+
+
+class SalesReportTestCase(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        ProductVariant.objects.update(quantity=100)
+
+    def sell(self, day, items, hour=12):
+        """A delivered order placed at `hour` local time on `day`."""
+        order_id = self.create_order(items).data['id']
+        created_at = timezone.make_aware(datetime.combine(day, time(hour)))
+        Order.objects.filter(pk=order_id).update(created_at=created_at)
+        self.deliver(order_id)
+        return order_id
+
+
+class ProductSalesTests(SalesReportTestCase):
+    def setUp(self):
+        super().setUp()
+        # A second product with the same name must not be merged with the first.
+        self.other_tee = Product.objects.create(name='Tee', purchase_price=20, sale_price=60)
+        self.white_tee = ProductVariant.objects.create(product=self.other_tee, color='White', size='M', quantity=100)
+        self.blue_tee = ProductVariant.objects.create(product=self.tee, color='Blue', size='M', quantity=100)
+        self.sell(date(2026, 3, 2), [line('Tee', 'Red', 'M', 1, 100), line('Cap', 'Blue', 'L', 4, 30)])
+        self.sell(date(2026, 3, 3), [line('Tee', 'Blue', 'M', 2, 100)])
+        self.sell(date(2026, 4, 1), [line('Tee', 'Red', 'M', 1, 100)])
+        self.sell(date(2026, 3, 3), [line('Tee', 'White', 'M', 3, 60)])
+
+    def best_sellers(self, **params):
+        response = self.client.get('/api/reports/best-sellers/', {'from': '2026-03-01', 'to': '2026-04-30', **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(row['product_id'], row['quantity_sold']) for row in response.data['products']]
+
+    def test_best_sellers_are_ranked_per_product(self):
+        self.assertEqual(self.best_sellers(), [(self.tee.id, 4), (self.cap.id, 4), (self.other_tee.id, 3)])
+        self.assertEqual(self.best_sellers(order_by='sales'), [(self.tee.id, 4), (self.other_tee.id, 3), (self.cap.id, 4)])
+        self.assertEqual(self.best_sellers(order_by='profit', limit=1), [(self.tee.id, 4)])
+        self.assertEqual(self.best_sellers(to='2026-03-31'), [(self.cap.id, 4), (self.tee.id, 3), (self.other_tee.id, 3)])
+
+    def test_invalid_ranking_is_rejected(self):
+        for params in ({'order_by': 'name'}, {'limit': 'ten'}, {'from': '2026-05-01', 'to': '2026-04-01'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/reports/best-sellers/', params).status_code, 400)
+
+    def test_product_trend_is_split_by_variant(self):
+        response = self.client.get(
+            f'/api/reports/products/{self.tee.id}/', {'from': '2026-03-01', 'to': '2026-04-30', 'group': 'month'}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        march, april = response.data['series']
+        self.assertEqual((march['period'], march['quantity_sold'], march['total_sale_price']), ('2026-03-01', 3, 300.0))
+        self.assertEqual(
+            [(v['color'], v['quantity_sold']) for v in march['variants']], [('Red', 1), ('Blue', 2)]
+        )
+        self.assertEqual((april['period'], april['quantity_sold']), ('2026-04-01', 1))
+        self.assertEqual(self.client.get('/api/reports/products/0/').status_code, 404)
+
+
+class ReportComparisonTests(SalesReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sell(date(2026, 3, 2), [line('Tee', 'Red', 'M', 1, 100)])
+        self.sell(date(2026, 3, 3), [line('Tee', 'Red', 'M', 2, 100)])
+        self.sell(date(2026, 3, 3), [line('Cap', 'Blue', 'L', 1, 30)])
+
+    def daily(self, **params):
+        return self.client.get('/api/reports/daily/', {'date': '2026-03-03', **params})
+
+    def test_previous_day_totals_and_deltas(self):
+        report = self.daily(compare='previous').data
+        self.assertEqual((report['total_orders'], report['total_sales']), (2, 230.0))
+        self.assertEqual(report['baseline']['from'], '2026-03-02')
+        self.assertEqual((report['baseline']['total_orders'], report['baseline']['total_sales']), (1, 100.0))
+        self.assertEqual(report['deltas']['total_sales'], {'change': 130.0, 'percent': 130.0})
+        self.assertEqual(report['deltas']['total_visitors'], {'change': 0, 'percent': None})
+
+    def test_explicit_baseline_and_monthly_comparison(self):
+        report = self.daily(baseline_from='2026-02-01', baseline_to='2026-03-02').data
+        self.assertEqual(report['baseline']['total_orders'], 1)
+        report = self.client.get('/api/reports/monthly/', {'year': 2026, 'month': 4, 'compare': 'previous'}).data
+        self.assertEqual((report['baseline']['from'], report['baseline']['to']), ('2026-03-01', '2026-03-31'))
+        self.assertEqual(report['deltas']['total_orders'], {'change': -3, 'percent': -100.0})
+
+    def test_comparison_costs_no_extra_queries(self):
+        counts = []
+        for params in ({}, {'compare': 'previous'}):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.daily(**params).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_baselines_are_rejected(self):
+        for params in (
+            {'compare': 'last-year'},
+            {'baseline_from': '2026-03-03', 'baseline_to': '2026-03-04'},
+            {'baseline_from': '2026-03-02', 'baseline_to': '2026-03-01'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.daily(**params).status_code, 400)
+
+
+class LocalBucketingTests(SalesReportTestCase):
+    def setUp(self):
+        super().setUp()
+        # 00:30 in Cairo is still the previous day in UTC.
+        self.sell(date(2026, 3, 3), [line('Tee', 'Red', 'M', 1, 100)], hour=0)
+        self.sell(date(2026, 3, 1), [line('Cap', 'Blue', 'L', 1, 30)], hour=23)
+        self.sell(date(2026, 3, 2), [line('Cap', 'Blue', 'L', 1, 30)])
+        for day, hour, ip in [(date(2026, 3, 3), 0, '10.0.0.1'), (date(2026, 3, 3), 9, '10.0.0.1'), (date(2026, 3, 1), 23, '10.0.0.2')]:
+            visit = VisitorLog.objects.create(ip_address=ip)
+            VisitorLog.objects.filter(pk=visit.pk).update(
+                visited_at=timezone.make_aware(datetime.combine(day, time(hour)))
+            )
+
+    def series(self, group):
+        response = self.client.get('/api/reports/range/', {'from': '2026-03-01', 'to': '2026-03-31', 'group': group})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(row['period'], row['total_orders'], row['total_visitors']) for row in response.data['series']]
+
+    def test_days_follow_the_local_calendar(self):
+        self.assertEqual(self.series('day'), [('2026-03-01', 1, 1), ('2026-03-02', 1, 0), ('2026-03-03', 1, 1)])
+        report = self.client.get('/api/reports/daily/', {'date': '2026-03-03'}).data
+        self.assertEqual((report['total_orders'], report['total_sales'], report['total_visitors']), (1, 100.0, 1))
+
+    def test_weeks_start_on_monday_and_months_group_everything(self):
+        self.assertEqual(self.series('week'), [('2026-02-23', 1, 1), ('2026-03-02', 2, 1)])
+        self.assertEqual(self.series('month'), [('2026-03-01', 3, 2)])
+
+    def test_invalid_group_is_rejected(self):
+        response = self.client.get('/api/reports/range/', {'group': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductSearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        red_cap = Product.objects.create(name='Red Cap', purchase_price=10, sale_price=35)
+        classic_tee = Product.objects.create(name='Classic Tee', purchase_price=30, sale_price=90)
+        ProductVariant.objects.create(product=red_cap, color='Black', size='L', quantity=1)
+        ProductVariant.objects.create(product=classic_tee, color='Red', size='S', quantity=1)
+        rebuild_index()
+        product_index.rebuild()
+        self.addCleanup(product_index.invalidate)
+
+    def search(self, query):
+        response = self.client.get('/api/products/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data]
+
+    def test_prefix_hits_come_first_and_fts_fills_the_rest(self):
+        names = self.search('red')
+        self.assertEqual(names[0], 'Red Cap')
+        self.assertIn('Classic Tee', names)
+        self.assertIn('Tee', names)
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_unmatched_query_returns_nothing(self):
+        self.assertEqual(self.search('zzz'), [])
+
+
+class CatalogFieldsTests(CatalogTestCase):
+    def test_purchase_price_follows_the_user_row(self):
+        self.client = APIClient()
+        response = self.client.post('/api/login/', {'email': self.user.email, 'password': 'Secret123!'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/api/products/{self.tee.id}/')
+        self.assertEqual(response.data['purchase_price'], 40)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = False
+            self.user.save()
+        # Same session cookie, but the user is no longer an admin.
+        response = self.client.get(f'/api/products/{self.tee.id}/')
+        self.assertNotIn('purchase_price', response.data)
+        response = self.client.get(f'/api/products/{self.tee.id}/', {'fields': 'name,purchase_price'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderItemEditTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for size in ('XS', 'S', 'L', 'XL'):
+            ProductVariant.objects.create(product=self.tee, color='Red', size=size, quantity=5)
+
+    def stock(self, size):
+        return ProductVariant.objects.get(product=self.tee, color='Red', size=size).quantity
+
+    def edit(self, order_id, items):
+        response = self.client.patch(f'/api/orders/{order_id}/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_only_changed_lines_are_written(self):
+        order_id = self.create_order([line('Tee', 'Red', 'M', 2, 100), line('Cap', 'Blue', 'L', 1, 30)]).data['id']
+        tee_line = OrderItem.objects.get(product_variant=self.red_tee)
+
+        self.edit(order_id, [line('Tee', 'Red', 'M', 3, 100), line('Tee', 'Red', 'S', 1, 100)])
+
+        items = {item.product_variant_id: item for item in OrderItem.objects.filter(order_id=order_id)}
+        self.assertEqual(items[self.red_tee.id].id, tee_line.id)
+        self.assertEqual(items[self.red_tee.id].quantity, 3)
+        self.assertNotIn(self.blue_cap.id, items)
+        # Stock moves by the net change per variant.
+        self.assertEqual(self.stock('M'), 2)
+        self.assertEqual(self.stock('S'), 4)
+        self.blue_cap.refresh_from_db()
+        self.assertEqual(self.blue_cap.quantity, 2)
+
+    def test_query_count_does_not_grow_with_the_order(self):
+        counts = []
+        for sizes in (('M',), ('M', 'XS', 'S', 'L', 'XL')):
+            order_id = self.create_order([line('Tee', 'Red', size, 1, 100) for size in sizes]).data['id']
+            edited = [line('Tee', 'Red', size, 1, 100) for size in sizes]
+            edited[0]['quantity'] = 2
+            with CaptureQueriesContext(connection) as queries:
+                self.edit(order_id, edited)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class OrderSummaryTests(CatalogTestCase):
+    def test_item_edit_recomputes_summary_columns(self):
+        Coupon.objects.create(user=self.user, code='OS-TEST0001', value=500)
+        payload = order_payload([line('Cap', 'Blue', 'L', 1, 30), line('Tee', 'Red', 'M', 1, 100)])
+        payload.update(coupon_code='OS-TEST0001', total_price='140.00')
+        response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get()
+        self.assertEqual(order.coupon_discount, Decimal('30.00'))
+
+        # Dropping the cap makes the tee the first line, so the coupon now covers it.
+        response = self.client.patch(
+            f'/api/orders/{order.id}/', {'items': [line('Tee', 'Red', 'M', 2, 100)]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['coupon_discount'], '100.00')
+        order.refresh_from_db()
+        self.assertEqual((order.item_count, order.original_cart_total), (2, Decimal('200.00')))
+        self.assertEqual(order.coupon_discount, Decimal('100.00'))
+
+
+class PrefixIndexTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        product_index.rebuild()
+        user_index.rebuild()
+        self.addCleanup(product_index.invalidate)
+        self.addCleanup(user_index.invalidate)
+
+    def names(self, query):
+        return [product['name'] for product in product_index.search(query)]
+
+    def test_matches_any_word_prefix(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Blue Shirt', purchase_price=10, sale_price=20)
+        self.assertEqual(self.names('shi'), ['Blue Shirt'])
+        self.assertEqual(self.names('blue s'), ['Blue Shirt'])
+        self.assertEqual(self.names('irt'), [])
+
+    def test_writes_are_applied_without_a_rebuild(self):
+        rebuilds = product_index.stats()['rebuilds']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cap.name = 'Bucket Hat'
+            self.cap.save()
+        self.assertEqual(self.names('cap'), [])
+        self.assertEqual(self.names('buck'), ['Bucket Hat'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cap.delete()
+        self.assertEqual(self.names('buck'), [])
+        self.assertEqual(product_index.stats()['rebuilds'], rebuilds)
+
+    def test_user_autocomplete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.create_user(
+                username='ahmed@example.com', email='ahmed@example.com', password='Secret123!', first_name='Ahmed'
+            )
+        response = self.client.get('/api/users/search/', {'q': 'ah'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([u['first_name'] for u in response.data], ['Ahmed'])
+
+
+class PrefixIndexWarmUpTests(TransactionTestCase):
+    def test_first_request_loads_the_indexes_in_the_background(self):
+        self.addCleanup(request_started.connect, warm_prefix_indexes, dispatch_uid=WARM_UP_UID)
+        self.addCleanup(product_index.invalidate)
+        Product.objects.create(name='Warm Scarf', purchase_price=10, sale_price=20)
+        product_index.invalidate()
+
+        APIClient().get('/api/products/')
+        # The build runs in its own thread while holding the build lock.
+        with product_index._build_lock:
+            self.assertFalse(product_index._is_stale())
+        self.assertEqual([p['name'] for p in product_index.search('scarf')], ['Warm Scarf'])
+        # The receiver disconnected itself, so later requests do not warm again.
+        self.assertFalse(request_started.disconnect(dispatch_uid=WARM_UP_UID))
+
+
+class CouponCodeTests(CatalogTestCase):
+    def test_codes_are_distinct_and_unused(self):
+        codes = new_coupon_codes(50)
+        self.assertEqual(len(set(codes)), 50)
+        self.assertTrue(all(len(code) == 11 and code.startswith('OS-') for code in codes))
+
+    def test_gives_up_when_every_candidate_is_taken(self):
+        fixed = uuid.UUID('12345678123456781234567812345678')
+        Coupon.objects.create(user=self.user, code='OS-12345678')
+        with mock.patch('api.loyalty.uuid.uuid4', return_value=fixed):
+            with self.assertRaises(RuntimeError):
+                new_coupon_codes(1)
+
+
+class MediaStorageTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        use_temporary_media(self)
+        self.storage = ProductImage._meta.get_field('image').storage
+
+    def age(self, name):
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(self.storage.path(name), (old, old))
+        return name
+
+    def store_old(self, data):
+        return self.age(self.storage.save('photo.png', ContentFile(data)))
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command('gc_media', '--min-age-hours', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_same_bytes_are_stored_once(self):
+        first = self.storage.save('front.png', ContentFile(b'same bytes'))
+        second = self.storage.save('back.PNG', ContentFile(b'same bytes'))
+        other = self.storage.save('side.png', ContentFile(b'other bytes'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^products/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+
+    def test_reusing_a_file_refreshes_its_age(self):
+        name = self.store_old(b'photo')
+        self.assertEqual(self.storage.save('again.png', ContentFile(b'photo')), name)
+        self.gc()
+        self.assertTrue(self.storage.exists(name))
+
+    def test_gc_deletes_only_old_unreferenced_files(self):
+        kept = self.store_old(b'kept')
+        ProductImage.objects.create(product=self.tee, image=kept)
+        orphan = self.store_old(b'orphan')
+        young = self.storage.save('young.png', ContentFile(b'young'))
+
+        self.assertIn('Would delete 1 orphaned files', self.gc('--dry-run'))
+        self.assertTrue(self.storage.exists(orphan))
+
+        self.gc()
+        self.assertTrue(self.storage.exists(kept))
+        self.assertTrue(self.storage.exists(young))
+        self.assertFalse(self.storage.exists(orphan))
+
+    def test_gc_rechecks_references_before_deleting(self):
+        image = self.store_old(b'reused')
+        derivative = self.age(default_storage.save(f"products/derivatives/{'a' * 64}_card.webp", ContentFile(b'card')))
+        walk = gc_media.walk
+
+        def walk_while_uploading(storage, directory):
+            # Rows pointing at the files commit after the referenced set was built.
+            ProductImage.objects.create(
+                product=self.tee, image=image, derivatives={'card': {'webp': derivative}}
+            )
+            yield from walk(storage, directory)
+
+        with mock.patch.object(gc_media, 'walk', walk_while_uploading):
+            self.gc()
+        self.assertTrue(self.storage.exists(image))
+        self.assertTrue(self.storage.exists(derivative))
@@ -6,11 +6,13 @@ from .views import (
     RegisterView,LoginView,
     PasswordResetRequestView,PasswordResetConfirmView,
     CheckAuthView,LogoutView,
-    ProductCreateView,ProductListView,ProductDetailView,ProductSearchView,
+    ProductCreateView,ProductListView,ProductDetailView,ProductSearchView,SearchIndexStatsView,
+    ProductImportView,
     UserProfileView,UserListView,UserDetailView,UserSearchView,UserOrderListView,
-    OrderListView,OrderDetailView,
+    OrderListView,OrderDetailView,OrderExportView,OrderBulkStatusView,
+    SyncView,
     ProductVariantSearchView,
-    DailyReportView,MonthlyReportView,
+    DailyReportView,MonthlyReportView,RangeReportView,BestSellersView,ProductSalesTrendView,
     UserCouponsView,CouponValidateView,
     TrackVisitView,LiveVisitorsView
 )
@@ -23,6 +25,7 @@ urlpatterns = [
     path('auth/check/', CheckAuthView.as_view(), name='auth-check'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('products/create/', ProductCreateView.as_view(), name='product-create'),
+    path('products/import/', ProductImportView.as_view(), name='product-import'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('products/', ProductListView.as_view(), name='product-list'),
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
@@ -31,10 +34,17 @@ urlpatterns = [
     path('users/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
     path('orders/', OrderListView.as_view(), name='order-list'),
     path('orders/<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
+    path('orders/export/', OrderExportView.as_view(), name='order-export'),
+    path('orders/bulk-status/', OrderBulkStatusView.as_view(), name='order-bulk-status'),
     path('users/search/', UserSearchView.as_view(), name='user-search'),
     path('products/search/', ProductSearchView.as_view(), name='product-search'),
+    path('search/stats/', SearchIndexStatsView.as_view(), name='search-index-stats'),
+    path('sync/<str:resource>/', SyncView.as_view(), name='sync'),
     path('reports/daily/', DailyReportView.as_view(), name='daily-report'),
     path('reports/monthly/', MonthlyReportView.as_view(), name='monthly-report'),
+    path('reports/range/', RangeReportView.as_view(), name='range-report'),
+    path('reports/best-sellers/', BestSellersView.as_view(), name='best-sellers-report'),
+    path('reports/products/<int:pk>/', ProductSalesTrendView.as_view(), name='product-sales-report'),
     path('products/variants/search/', ProductVariantSearchView.as_view(), name='product-variant-search'),
     path('user/orders/', UserOrderListView.as_view(), name='user-order-list'),
     path('user/coupons/', UserCouponsView.as_view(), name='user-coupons'),
@@ -2,17 +2,36 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
-from .models import CustomUser,Report,Order,OrderItem,Product,ProductVariant,Coupon,VisitorLog, PasswordResetToken
+from .models import CustomUser,Order,Product,ProductVariant,Coupon,VisitorLog, PasswordResetToken
 from rest_framework_simplejwt.exceptions import TokenError
-from .serializers import UserSerializer,ProductSerializer,ReportSerializer,OrderSerializer,CouponSerializer
+from .serializers import UserSerializer,ProductSerializer,OrderSerializer,CouponSerializer,parse_fieldset
 from django.utils import timezone
-from datetime import timedelta , datetime
+from datetime import timedelta , datetime, date
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
 from api.authentication import CookieJWTAuthentication
-from django.db.models import Sum, F, DecimalField
+from .pagination import KeysetPagination
+from .catalog_cache import cached_catalog_response, is_catalog_admin
+from .catalog_filters import filter_products, catalog_facets
+from .order_filters import filter_orders, ORDER_STATUSES
+from .loyalty import publish_status_changes
+from .idempotency import claim_idempotency_key, store_response, release_idempotency_key
+from .search import search_products
+from .prefix_index import user_index, product_index
+from .importers import detect_format, import_products
+from .exporters import EXPORT_FORMATS, export_orders
+from .reports import (
+    rollup_report, rollup_series, best_sellers, product_sales_series, order_details, delivered_orders,
+    local_day_bounds, preceding_period, report_baseline, report_range, report_group, BEST_SELLER_ORDERING
+)
+from .rollups import track_orders
+from .sync import SYNC_RESOURCES, parse_watermark, sync_window, changed_since, deleted_since, prune_tombstones
+from django.db import transaction
 import uuid
 from django.conf import settings
 from django.core.mail import send_mail
+from django.views.static import serve
+from django.http import StreamingHttpResponse
 import logging
 logger = logging.getLogger(__name__)
 
@@ -34,6 +53,19 @@ def is_admin_user(request):
             {'detail': 'Invalid token.'},
             status=status.HTTP_401_UNAUTHORIZED
         )
+def token_is_admin(request):
+    """
+    Whether the access cookie belongs to an admin. Decided from the user row
+    like is_admin_user(), through a short-lived cache (is_catalog_admin).
+    """
+    access_token = request.COOKIES.get('access_token')
+    if not access_token:
+        return False
+    try:
+        token = AccessToken(access_token)
+    except TokenError:
+        return False
+    return is_catalog_admin(token['user_id'])
 def is_admin_us(user):
     return user.is_authenticated and (user.is_staff or user.is_superuser)
 
@@ -181,12 +213,87 @@ class ProductCreateView(APIView):
     
 
 
+def serve_immutable_media(request, path):
+    # Content-addressed files never change under the same name.
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = f"public, max-age={settings.IMMUTABLE_MEDIA_MAX_AGE}, immutable"
+    return response
+
+
+class ProductImportView(APIView):
+    authentication_classes = [CookieJWTAuthentication]
+
+    def post(self, request):
+        is_admin, response = is_admin_user(request)
+        if not is_admin:
+            return response
+
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({"message": "A file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = detect_format(upload.name, request.data.get('file_format'))
+        if file_format is None:
+            return Response(
+                {"message": "Unsupported file format. Use csv or jsonl."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            batch_size = int(request.data.get('batch_size', 500))
+        except ValueError:
+            return Response({"message": "batch_size must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        summary = import_products(upload.file, file_format, batch_size=batch_size)
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+ADMIN_PRODUCT_FIELDS = ('purchase_price',)
+
+
+def catalog_fieldset(request):
+    """
+    ?fields= for catalog views. Purchase prices are only shown to admins,
+    and asking for them without admin rights is a 400.
+    """
+    fields, _ = parse_fieldset(request, ProductSerializer)
+    is_admin = token_is_admin(request)
+    if not is_admin:
+        denied = [f for f in fields or () if f in ADMIN_PRODUCT_FIELDS]
+        if denied:
+            raise ValidationError({'fields': f"Not allowed: {', '.join(denied)}"})
+        if fields is None:
+            fields = [
+                f for f in ProductSerializer.readable_fields()
+                if f not in ADMIN_PRODUCT_FIELDS and f not in ProductSerializer.optional_fields
+            ]
+    return fields, ('admin' if is_admin else 'public')
+
+
 class ProductListView(APIView):
+    def build(self, request, fields):
+        products = filter_products(Product.objects.all(), request.query_params)
+        products = ProductSerializer.optimize_queryset(products, fields)
+        with_facets = request.query_params.get('facets', '').lower() in ('1', 'true', 'yes')
+        if KeysetPagination.is_requested(request):
+            paginator = KeysetPagination(ordering=('-id',))
+            page = paginator.paginate_queryset(products, request)
+            serializer = ProductSerializer(page, many=True, fields=fields)
+            data = paginator.get_paginated_data(serializer.data)
+            if with_facets:
+                data['facets'] = catalog_facets()
+            return data
+        serializer = ProductSerializer(products, many=True, fields=fields)
+        if with_facets:
+            return {'results': serializer.data, 'facets': catalog_facets()}
+        return serializer.data
+
     def get(self, request):
         try:
-            products = Product.objects.all()
-            serializer = ProductSerializer(products, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            fields, audience = catalog_fieldset(request)
+            return cached_catalog_response(
+                request, f'product-list:{audience}', lambda: self.build(request, fields)
+            )
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             print(f"Error fetching products: {str(e)}")
             return Response(
@@ -198,9 +305,17 @@ class ProductListView(APIView):
 class ProductDetailView(APIView):
     def get(self, request, pk):
         try:
-            product = Product.objects.get(pk=pk)
-            serializer = ProductSerializer(product)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            fields, audience = catalog_fieldset(request)
+            return cached_catalog_response(
+                request,
+                f'product-detail:{audience}',
+                lambda: ProductSerializer(
+                    ProductSerializer.optimize_queryset(Product.objects.all(), fields).get(pk=pk),
+                    fields=fields
+                ).data
+            )
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Product.DoesNotExist:
             return Response(
                 {"message": "Product not found"},
@@ -279,8 +394,12 @@ class UserListView(APIView):
         is_admin, response = is_admin_user(request)
         if not is_admin:
             return response
-        users = CustomUser.objects.all()
-        serializer = UserSerializer(users, many=True)
+        try:
+            fields, _ = parse_fieldset(request, UserSerializer)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        users = UserSerializer.optimize_queryset(CustomUser.objects.all(), fields)
+        serializer = UserSerializer(users, many=True, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request):
@@ -299,9 +418,12 @@ class UserDetailView(APIView):
         if not is_admin:
             return response
         try:
-            user = CustomUser.objects.get(pk=pk)
-            serializer = UserSerializer(user)
+            fields, _ = parse_fieldset(request, UserSerializer)
+            user = UserSerializer.optimize_queryset(CustomUser.objects.all(), fields).get(pk=pk)
+            serializer = UserSerializer(user, fields=fields)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except CustomUser.DoesNotExist:
             return Response({"message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -393,9 +515,12 @@ class UserOrderListView(APIView):
                     {"message": "Authentication required."},
                     status=status.HTTP_401_UNAUTHORIZED
                 )
-            orders = Order.objects.prefetch_related('items__product_variant__product').filter(user=user)
-            serializer = OrderSerializer(orders, many=True)
+            fields, expand = parse_fieldset(request, OrderSerializer)
+            orders = OrderSerializer.optimize_queryset(Order.objects.filter(user=user), fields, expand)
+            serializer = OrderSerializer(orders, many=True, fields=fields, expand=expand)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"message": "Failed to fetch user orders", "error": str(e)},
@@ -410,8 +535,18 @@ class OrderListView(APIView):
         is_admin, response = is_admin_user(request)
         if not is_admin:
             return response
-        orders = Order.objects.prefetch_related('items__product_variant__product').all()
-        serializer = OrderSerializer(orders, many=True)
+        try:
+            fields, expand = parse_fieldset(request, OrderSerializer)
+            orders = filter_orders(Order.objects.all(), request.query_params)
+            orders = OrderSerializer.optimize_queryset(orders, fields, expand)
+            if KeysetPagination.is_requested(request):
+                paginator = KeysetPagination(ordering=('-created_at', '-id'))
+                page = paginator.paginate_queryset(orders, request)
+                serializer = OrderSerializer(page, many=True, fields=fields, expand=expand)
+                return Response(paginator.get_paginated_data(serializer.data), status=status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        serializer = OrderSerializer(orders, many=True, fields=fields, expand=expand)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request):
@@ -420,12 +555,30 @@ class OrderListView(APIView):
                 {"message": "Authentication required."},
                 status=status.HTTP_401_UNAUTHORIZED
             )
+        # Retries carrying the same Idempotency-Key get the first response back.
+        record = None
+        key = request.headers.get('Idempotency-Key')
+        if key:
+            record, replay = claim_idempotency_key(request, key)
+            if replay is not None:
+                return replay
+        response = self.create_order(request, record)
+        if record is not None and response.status_code != status.HTTP_201_CREATED:
+            release_idempotency_key(record)
+        return response
+
+    def create_order(self, request, record):
         try:
             serializer = OrderSerializer(data=request.data, context={'request': request})
             if serializer.is_valid():
-                order = serializer.save()
+                with transaction.atomic():
+                    order = serializer.save()
+                    if record is not None:
+                        store_response(record, status.HTTP_201_CREATED, serializer.data)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             print(f"Error creating order: {str(e)}") 
             return Response(
@@ -434,15 +587,90 @@ class OrderListView(APIView):
             )
 
 
+class OrderBulkStatusView(APIView):
+    """
+    Move many orders to one status: {"ids": [...], "status": "delivered"}.
+
+    Statuses are changed with a single UPDATE; the loyalty points for every
+    affected user are queued as one outbox event in the same transaction.
+    """
+    def post(self, request):
+        is_admin, response = is_admin_user(request)
+        if not is_admin:
+            return response
+        new_status = request.data.get('status')
+        ids = request.data.get('ids')
+        if new_status not in ORDER_STATUSES:
+            return Response(
+                {"status": f"Invalid status. Use one of: {', '.join(ORDER_STATUSES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return Response({"ids": "A non-empty list of order ids is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update().filter(id__in=ids)
+                .values_list('id', 'user_id', 'status', 'coupon_code')
+            )
+            changes = [order for order in orders if order[2] != new_status]
+            if changes:
+                with track_orders([order[0] for order in changes if 'delivered' in (order[2], new_status)]):
+                    Order.objects.filter(id__in=[order[0] for order in changes]).update(
+                        status=new_status, updated_at=timezone.now()
+                    )
+                publish_status_changes(
+                    (user_id, old_status, new_status, coupon_code)
+                    for _, user_id, old_status, coupon_code in changes
+                )
+
+        found = {order[0] for order in orders}
+        return Response({
+            "updated": [order[0] for order in changes],
+            "unchanged": sorted(found - {order[0] for order in changes}),
+            "not_found": sorted(set(ids) - found),
+        }, status=status.HTTP_200_OK)
+
+
+class OrderExportView(APIView):
+    """
+    Stream orders and their items as CSV (?file_format=csv, one row per item)
+    or NDJSON (?file_format=ndjson, one order per line). Accepts the same
+    filters as the order list, e.g. ?date_from=&date_to=.
+    """
+    def get(self, request):
+        is_admin, response = is_admin_user(request)
+        if not is_admin:
+            return response
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {"message": f"Unsupported file_format. Use one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            orders = filter_orders(Order.objects.all(), request.query_params)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export_orders(orders, file_format), content_type=EXPORT_FORMATS[file_format])
+        filename = f"orders-{timezone.localdate().isoformat()}.{file_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 class OrderDetailView(APIView):
     def get(self, request, pk):
         is_admin, response = is_admin_user(request)
         if not is_admin:
             return response
         try:
-            order = Order.objects.prefetch_related('items__product_variant__product').get(pk=pk)
-            serializer = OrderSerializer(order)
+            fields, expand = parse_fieldset(request, OrderSerializer)
+            order = OrderSerializer.optimize_queryset(Order.objects.all(), fields, expand).get(pk=pk)
+            serializer = OrderSerializer(order, fields=fields, expand=expand)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Order.DoesNotExist:
             return Response({"message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -471,14 +699,56 @@ class OrderDetailView(APIView):
         except Order.DoesNotExist:
             return Response({"message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
+class SyncView(APIView):
+    """
+    Rows of `resource` changed since ?updated_since=, for admin screens
+    that keep a local copy instead of refetching the whole list.
+    """
+    serializer_classes = {
+        'orders': OrderSerializer,
+        'products': ProductSerializer,
+        'users': UserSerializer,
+    }
+
+    def get(self, request, resource):
+        is_admin, response = is_admin_user(request)
+        if not is_admin:
+            return response
+        if resource not in SYNC_RESOURCES:
+            return Response({"message": f"Unknown resource '{resource}'."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer_class = self.serializer_classes[resource]
+        _, model, _ = SYNC_RESOURCES[resource]
+        try:
+            fields, expand = parse_fieldset(request, serializer_class)
+            since = parse_watermark(request.query_params.get('updated_since'))
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        now, watermark, full = sync_window(since)
+        queryset = serializer_class.optimize_queryset(model.objects.all(), fields, expand)
+        if full:
+            changed, deleted = queryset.order_by('id'), []
+        else:
+            changed, deleted = changed_since(resource, queryset, since), deleted_since(resource, since)
+        prune_tombstones(now)
+
+        serializer = serializer_class(changed, many=True, fields=fields, expand=expand, context={'request': request})
+        return Response({
+            'full': full,
+            'changed': serializer.data,
+            'deleted': deleted,
+            'watermark': watermark.isoformat(),
+        }, status=status.HTTP_200_OK)
+
+
 class UserSearchView(APIView):
     def get(self, request):
         is_admin, response = is_admin_user(request)
         if not is_admin:
             return response
         query = request.query_params.get('q', '')
-        users = CustomUser.objects.filter(first_name__icontains=query)[:10]
-        return Response([{'id': u.id, 'first_name': u.first_name} for u in users], status=status.HTTP_200_OK)
+        return Response(user_index.search(query, limit=10), status=status.HTTP_200_OK)
 
 class ProductSearchView(APIView):
     def get(self, request):
@@ -486,11 +756,29 @@ class ProductSearchView(APIView):
         if not is_admin:
             return response
         query = request.query_params.get('q', '')
-        products = Product.objects.filter(name__icontains=query)[:10]
-        return Response([
-            {'id': p.id, 'name': p.name, 'sale_price': str(p.sale_price)} 
-            for p in products
-        ], status=status.HTTP_200_OK)
+        # Name prefixes are answered from memory first; the remaining slots
+        # are filled from the FTS index (category, color, size, mid-word
+        # matches), skipping products the prefix index already returned.
+        limit = 10
+        products = product_index.search(query, limit=limit)
+        if len(products) < limit:
+            seen = {product['id'] for product in products}
+            products += [
+                product for product in search_products(query, limit=limit)
+                if product['id'] not in seen
+            ][:limit - len(products)]
+        return Response(products, status=status.HTTP_200_OK)
+
+
+class SearchIndexStatsView(APIView):
+    def get(self, request):
+        is_admin, response = is_admin_user(request)
+        if not is_admin:
+            return response
+        return Response({
+            'users': user_index.stats(),
+            'products': product_index.stats(),
+        }, status=status.HTTP_200_OK)
     
     
 class ProductVariantSearchView(APIView):
@@ -515,14 +803,29 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from .authentication import CookieJWTAuthentication
-from .models import VisitorLog, Order, OrderItem, Coupon, Report
-from django.db.models import Sum, F, DecimalField
+from .models import VisitorLog, Order, Coupon
 from django.utils import timezone
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def report_orders(request, first_day, last_day):
+    """
+    Delivered order details of the local days first_day..last_day in keyset
+    pages (?cursor=, ?page_size=), or None unless ?orders=1 or a cursor was
+    passed.
+    """
+    requested = request.query_params.get('orders', '').lower() in ('1', 'true', 'yes')
+    if not (requested or KeysetPagination.is_requested(request)):
+        return None
+    start, end = local_day_bounds(first_day, last_day)
+    paginator = KeysetPagination(ordering=('-created_at', '-id'))
+    page = paginator.paginate_queryset(delivered_orders(start, end), request)
+    return paginator.get_paginated_data(order_details(page))
+
+
 class DailyReportView(APIView):
     authentication_classes = [CookieJWTAuthentication]
     permission_classes = [IsAuthenticated]
@@ -542,110 +845,15 @@ class DailyReportView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            start_date = timezone.make_aware(datetime.combine(report_date, datetime.min.time()))
-            end_date = start_date + timedelta(days=1)
-
-            orders = Order.objects.filter(
-                created_at__gte=start_date,
-                created_at__lt=end_date,
-                status='delivered'
-            ).prefetch_related('items__product_variant__product')
-
-            total_orders = orders.count()
-            total_sales = sum(
-                float(order.total_price - order.delivery_fee)
-                for order in orders
-            ) if orders.exists() else 0
-            total_sales_with_delivery = sum(
-                float(order.total_price)
-                for order in orders
-            ) if orders.exists() else 0
-
-            product_sales = (
-                OrderItem.objects.filter(order__in=orders)
-                .values('product_variant__product__name')
-                .annotate(
-                    total_quantity=Sum('quantity'),
-                    total_sale_price=Sum(F('sale_price') * F('quantity'), output_field=DecimalField()),
-                    total_purchase_price=Sum(F('purchase_price') * F('quantity'), output_field=DecimalField()),
-                    total_profit=Sum(
-                        (F('sale_price') - F('purchase_price')) * F('quantity'),
-                        output_field=DecimalField()
-                    )
-                )
-            )
-
-            total_profit = sum(item['total_profit'] for item in product_sales) or 0
-
-            # حساب عدد الزوار الفريدين بناءً على ip_address
-            unique_visitors = VisitorLog.objects.filter(
-                visited_at__gte=start_date,
-                visited_at__lt=end_date
-            ).values('ip_address').distinct().count()
-
-            order_details = []
-            for order in orders:
-                original_cart_total = sum(float(item.sale_price * item.quantity) for item in order.items.all())
-                coupon_discount = 0.0
-                if order.coupon_code:
-                    try:
-                        coupon = Coupon.objects.get(code=order.coupon_code, is_used=True)
-                        first_item_price = order.items.first().sale_price if order.items.exists() else 0
-                        coupon_discount = float(min(coupon.value, first_item_price))
-                    except Coupon.DoesNotExist:
-                        logger.warning(f"Coupon {order.coupon_code} not found for order {order.id}")
-
-                order_details.append({
-                    'order_id': order.id,
-                    'original_cart_total': float(original_cart_total),
-                    'cart_total': float(order.cart_total),
-                    'delivery_fee': float(order.delivery_fee),
-                    'total_price': float(order.total_price),
-                    'coupon_code': order.coupon_code,
-                    'coupon_discount': coupon_discount,
-                    'items': [
-                        {
-                            'product_name': item.product_variant.product.name,
-                            'quantity': item.quantity,
-                            'sale_price': float(item.sale_price),
-                            'total_sale_price': float(item.sale_price * item.quantity),
-                        }
-                        for item in order.items.all()
-                    ]
-                })
-
-            report_data = {
-                'date': report_date.isoformat(),
-                'total_orders': total_orders,
-                'total_sales': float(total_sales),
-                'total_sales_with_delivery': float(total_sales_with_delivery),
-                'total_profit': float(total_profit),
-                'total_visitors': unique_visitors,  # إضافة عدد الزوار
-                'products': [
-                    {
-                        'product_name': item['product_variant__product__name'],
-                        'quantity_sold': item['total_quantity'],
-                        'total_sale_price': float(item['total_sale_price']),
-                        'total_purchase_price': float(item['total_purchase_price']),
-                        'total_profit': float(item['total_profit'])
-                    }
-                    for item in product_sales
-                ],
-                'orders': order_details
-            }
-
-            report, created = Report.objects.get_or_create(
-                date=report_date,
-                defaults={'total_sales': total_sales, 'total_orders': total_orders, 'total_profit': total_profit}
-            )
-            if not created:
-                report.total_sales = total_sales
-                report.total_orders = total_orders
-                report.total_profit = total_profit
-                report.save()
-
+            baseline = report_baseline(request.query_params, report_date, report_date, preceding_period(report_date, report_date))
+            report_data = {'date': report_date.isoformat(), **rollup_report(report_date, report_date, baseline)}
+            orders = report_orders(request, report_date, report_date)
+            if orders is not None:
+                report_data['orders'] = orders
             return Response(report_data, status=status.HTTP_200_OK)
 
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"message": "Failed to generate report", "error": str(e)},
@@ -657,8 +865,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from .authentication import CookieJWTAuthentication
-from .models import VisitorLog, Order, OrderItem, Coupon
-from django.db.models import Sum, F, DecimalField
+from .models import VisitorLog, Order, Coupon
 from django.utils import timezone
 from datetime import datetime, timedelta
 import logging
@@ -684,104 +891,21 @@ class MonthlyReportView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            start_date = timezone.make_aware(datetime(year, month, 1))
-            if month == 12:
-                end_date = timezone.make_aware(datetime(year + 1, 1, 1))
-            else:
-                end_date = timezone.make_aware(datetime(year, month + 1, 1))
-
-            orders = Order.objects.filter(
-                created_at__gte=start_date,
-                created_at__lt=end_date,
-                status='delivered'
-            ).prefetch_related('items__product_variant__product')
-
-            total_orders = orders.count()
-            total_sales = sum(
-                float(order.total_price - order.delivery_fee)
-                for order in orders
-            ) if orders.exists() else 0
-            total_sales_with_delivery = sum(
-                float(order.total_price)
-                for order in orders
-            ) if orders.exists() else 0
-
-            product_sales = (
-                OrderItem.objects.filter(order__in=orders)
-                .values('product_variant__product__name')
-                .annotate(
-                    total_quantity=Sum('quantity'),
-                    total_sale_price=Sum(F('sale_price') * F('quantity'), output_field=DecimalField()),
-                    total_purchase_price=Sum(F('purchase_price') * F('quantity'), output_field=DecimalField()),
-                    total_profit=Sum(
-                        (F('sale_price') - F('purchase_price')) * F('quantity'),
-                        output_field=DecimalField()
-                    )
-                )
-            )
-
-            total_profit = sum(item['total_profit'] for item in product_sales) or 0
-
-            # حساب عدد الزوار الفريدين بناءً على ip_address
-            unique_visitors = VisitorLog.objects.filter(
-                visited_at__gte=start_date,
-                visited_at__lt=end_date
-            ).values('ip_address').distinct().count()
-
-            order_details = []
-            for order in orders:
-                original_cart_total = sum(float(item.sale_price * item.quantity) for item in order.items.all())
-                coupon_discount = 0.0
-                if order.coupon_code:
-                    try:
-                        coupon = Coupon.objects.get(code=order.coupon_code, is_used=True)
-                        first_item_price = order.items.first().sale_price if order.items.exists() else 0
-                        coupon_discount = float(min(coupon.value, first_item_price))
-                    except Coupon.DoesNotExist:
-                        logger.warning(f"Coupon {order.coupon_code} not found for order {order.id}")
-
-                order_details.append({
-                    'order_id': order.id,
-                    'original_cart_total': float(original_cart_total),
-                    'cart_total': float(order.cart_total),
-                    'delivery_fee': float(order.delivery_fee),
-                    'total_price': float(order.total_price),
-                    'coupon_code': order.coupon_code,
-                    'coupon_discount': coupon_discount,
-                    'items': [
-                        {
-                            'product_name': item.product_variant.product.name,
-                            'quantity': item.quantity,
-                            'sale_price': float(item.sale_price),
-                            'total_sale_price': float(item.sale_price * item.quantity),
-                        }
-                        for item in order.items.all()
-                    ]
-                })
+            first_day = date(year, month, 1)
+            next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
 
-            report_data = {
-                'year': year,
-                'month': month,
-                'total_orders': total_orders,
-                'total_sales': float(total_sales),
-                'total_sales_with_delivery': float(total_sales_with_delivery),
-                'total_profit': float(total_profit),
-                'total_visitors': unique_visitors,  # إضافة عدد الزوار
-                'products': [
-                    {
-                        'product_name': item['product_variant__product__name'],
-                        'quantity_sold': item['total_quantity'],
-                        'total_sale_price': float(item['total_sale_price']),
-                        'total_purchase_price': float(item['total_purchase_price']),
-                        'total_profit': float(item['total_profit'])
-                    }
-                    for item in product_sales
-                ],
-                'orders': order_details
-            }
+            last_day = next_month - timedelta(days=1)
+            previous_last = first_day - timedelta(days=1)
+            baseline = report_baseline(request.query_params, first_day, last_day, (previous_last.replace(day=1), previous_last))
+            report_data = {'year': year, 'month': month, **rollup_report(first_day, last_day, baseline)}
+            orders = report_orders(request, first_day, last_day)
+            if orders is not None:
+                report_data['orders'] = orders
 
             return Response(report_data, status=status.HTTP_200_OK)
 
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except ValueError:
             return Response(
                 {"message": "Invalid year or month format."},
@@ -795,6 +919,110 @@ class MonthlyReportView(APIView):
         
 
 
+class RangeReportView(APIView):
+    """
+    Sales for ?from=&to= (inclusive local dates) summed from the daily
+    rollups, with a ?group=day|week|month series. Order details are left
+    out unless ?orders=1 is passed, and then come in keyset pages
+    (?cursor=, ?page_size=). ?compare=previous (the same number of days
+    just before) or ?baseline_from=&baseline_to= adds the baseline totals
+    and deltas.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        is_admin, response = is_admin_user(request)
+        if not is_admin:
+            return response
+
+        params = request.query_params
+        try:
+            first_day, last_day = report_range(params)
+            group = report_group(params)
+            baseline = report_baseline(params, first_day, last_day, preceding_period(first_day, last_day))
+
+            report_data = {
+                'from': first_day.isoformat(),
+                'to': last_day.isoformat(),
+                'group': group,
+                **rollup_report(first_day, last_day, baseline),
+                'series': rollup_series(first_day, last_day, group),
+            }
+            orders = report_orders(request, first_day, last_day)
+            if orders is not None:
+                report_data['orders'] = orders
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(report_data, status=status.HTTP_200_OK)
+
+
+class BestSellersView(APIView):
+    """
+    Top products for ?from=&to= (inclusive local dates, default the last 30
+    days) ranked by ?order_by=quantity|sales|profit, at most ?limit= rows.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        is_admin, response = is_admin_user(request)
+        if not is_admin:
+            return response
+
+        params = request.query_params
+        try:
+            first_day, last_day = report_range(params)
+            order_by = params.get('order_by', 'quantity')
+            if order_by not in BEST_SELLER_ORDERING:
+                raise ValidationError({'order_by': f"Use one of: {', '.join(BEST_SELLER_ORDERING)}."})
+            try:
+                limit = min(max(int(params.get('limit', 10)), 1), 100)
+            except ValueError:
+                raise ValidationError({'limit': "A valid integer is required."})
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'from': first_day.isoformat(),
+            'to': last_day.isoformat(),
+            'order_by': order_by,
+            'products': best_sellers(first_day, last_day, order_by, limit),
+        }, status=status.HTTP_200_OK)
+
+
+class ProductSalesTrendView(APIView):
+    """Sales of one product per ?group=day|week|month over ?from=&to=, split by variant."""
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        is_admin, response = is_admin_user(request)
+        if not is_admin:
+            return response
+
+        product = Product.objects.filter(pk=pk).only('id', 'name').first()
+        if product is None:
+            return Response({"message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+        try:
+            first_day, last_day = report_range(params)
+            group = report_group(params)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'product_id': product.id,
+            'product_name': product.name,
+            'from': first_day.isoformat(),
+            'to': last_day.isoformat(),
+            'group': group,
+            'series': product_sales_series(product.id, first_day, last_day, group),
+        }, status=status.HTTP_200_OK)
+
+
 class TrackVisitView(APIView):
     def post(self, request):
         try:
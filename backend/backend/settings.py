@@ -1,5 +1,6 @@
 
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -90,9 +91,68 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Single-process setup: the catalog version, snapshots, admin flags and
+# prefix index generations live in this process's memory, so the API must
+# run as ONE process (threads are fine). Writes made by other processes
+# (e.g. `manage.py generate_image_derivatives`) only show up once the
+# timeouts below expire. To run several worker processes, switch this to a
+# shared backend such as django.core.cache.backends.redis.RedisCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Serialized product list/detail snapshots, keyed by the catalog version.
+# Kept short because the cache is per process (see CACHES above).
+CATALOG_CACHE_TIMEOUT = 30
+CATALOG_CACHE_MAX_AGE = 0
+
+# How long a user's admin flag is trusted before catalog views re-read it
+# from the database to decide whether to show purchase prices.
+CATALOG_ADMIN_CACHE_TIMEOUT = 60
+
+# In-process autocomplete indexes are rebuilt after this many seconds so that
+# writes made by other worker processes show up eventually. 0 disables it.
+PREFIX_INDEX_MAX_AGE = 300
+# Load the autocomplete indexes in a background thread when the process
+# serves its first request, and rebuild them there when they expire.
+# False builds them inline on the searching request, which tests rely on.
+PREFIX_INDEX_BACKGROUND_BUILDS = True
+
+# Threads rendering product image thumbnails/WebP copies off the request
+# thread. 0 renders them inline, which is handy when debugging. Images
+# uploaded earlier, or whose rendering failed, are picked up by
+# `manage.py generate_image_derivatives`.
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Delta sync (/api/sync/<resource>/). Deletions are remembered for this many
+# days; clients whose watermark is older get a full resync. Watermarks are
+# pulled back a few seconds so rows committed mid-request are not missed.
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+SYNC_WATERMARK_OVERLAP = 5
+
+# Outbox (api.outbox): side effects of order changes are carried out by
+# `manage.py run_outbox_worker`, run as its own process next to the web
+# server. It also picks up retries. Events stuck in 'processing' longer
+# than the lock timeout are retried. A single-process setup may set
+# OUTBOX_WORKERS > 0 to also drain on that many threads right after each
+# commit. Every process that does so competes with requests for the
+# SQLite write lock, so keep it 0 for web processes.
+OUTBOX_WORKERS = 0
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_MAX_DELAY = 60 * 10
+OUTBOX_LOCK_TIMEOUT = 60 * 5
+
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Product images are stored under their SHA-256, so their URLs never change
+# content and can be cached by browsers/CDNs for a year. Only applied by the
+# development media route; production servers set the header themselves.
+IMMUTABLE_MEDIA_MAX_AGE = 60 * 60 * 24 * 365
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -132,4 +192,13 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  
 ]
 CORS_ALLOW_CREDENTIALS=True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['idempotent-replayed']
+
+# Order POSTs sent with an Idempotency-Key header are remembered this long.
+# A key whose first request has been running longer than the lock timeout
+# (e.g. the worker died) may be picked up again by a retry. Expired keys are
+# deleted by `manage.py run_outbox_worker`.
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+IDEMPOTENCY_LOCK_TIMEOUT = 60
 ROOT_URLCONF = 'backend.urls'
\ No newline at end of file
@@ -1,11 +1,18 @@
-
 from django.contrib import admin
-from django.urls import path,include
+from django.urls import path,include,re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from api.storage import IMMUTABLE_MEDIA_RE
+from api.views import serve_immutable_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/',include('api.urls'))
+    path('api/',include('api.urls')),
 ]
+if settings.DEBUG:
+    # Like static(), only for development; in production the web server
+    # serves media and sets the immutable Cache-Control itself (see README).
+    urlpatterns += [
+        re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>{IMMUTABLE_MEDIA_RE})$', serve_immutable_media),
+    ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
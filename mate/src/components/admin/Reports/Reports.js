@@ -42,6 +42,9 @@ function Reports({ apiUrl = "http://localhost:8000/api/" }) {
     parseInt(localStorage.getItem("reportMonth")) || new Date().getMonth() + 1
   );
   const [reportData, setReportData] = useState(null);
+  const [reportQuery, setReportQuery] = useState(null);
+  const [ordersCursor, setOrdersCursor] = useState(null);
+  const [ordersLoading, setOrdersLoading] = useState(false);
   const [previousSales, setPreviousSales] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -110,42 +113,37 @@ function Reports({ apiUrl = "http://localhost:8000/api/" }) {
     return cookieValue;
   }
 
+  // Order details come in pages; `cursor` asks for the page after it.
+  const requestReport = (query, cursor) =>
+    axios.get(query.url, {
+      params: { ...query.params, orders: 1, ...(cursor ? { cursor } : {}) },
+      withCredentials: true,
+      headers: { "X-CSRFToken": getCookie("csrftoken") },
+    });
+
   const fetchReport = async () => {
     setLoading(true);
     setError(null);
-    const config = {
-      withCredentials: true,
-      headers: { "X-CSRFToken": getCookie("csrftoken") },
-    };
+    const query =
+      reportType === "daily"
+        ? {
+            url: `${apiUrl}reports/daily/`,
+            params: { date, compare: "previous" },
+          }
+        : {
+            url: `${apiUrl}reports/monthly/`,
+            params: { year, month, compare: "previous" },
+          };
 
     try {
-      let response;
-      if (reportType === "daily") {
-        response = await axios.get(`${apiUrl}reports/daily/`, {
-          params: { date },
-          ...config,
-        });
-        const prevDate = new Date(date);
-        prevDate.setDate(prevDate.getDate() - 1);
-        const prevResponse = await axios.get(`${apiUrl}reports/daily/`, {
-          params: { date: prevDate.toISOString().split("T")[0] },
-          ...config,
-        });
-        setPreviousSales(prevResponse.data.total_sales);
-      } else {
-        response = await axios.get(`${apiUrl}reports/monthly/`, {
-          params: { year, month },
-          ...config,
-        });
-        const prevMonth = month === 1 ? 12 : month - 1;
-        const prevYear = month === 1 ? year - 1 : year;
-        const prevResponse = await axios.get(`${apiUrl}reports/monthly/`, {
-          params: { year: prevYear, month: prevMonth },
-          ...config,
-        });
-        setPreviousSales(prevResponse.data.total_sales);
-      }
-      setReportData(response.data);
+      const response = await requestReport(query);
+      setPreviousSales(response.data.baseline?.total_sales ?? null);
+      setReportData({
+        ...response.data,
+        orders: response.data.orders.results,
+      });
+      setReportQuery(query);
+      setOrdersCursor(response.data.orders.next_cursor);
       setShowReport(true);
     } catch (err) {
       setError(err.response?.data?.message || "Failed to fetch report.");
@@ -155,6 +153,30 @@ function Reports({ apiUrl = "http://localhost:8000/api/" }) {
     }
   };
 
+  // Fetches the order pages after `ordersCursor` (only the next one unless
+  // `all` is set) and returns the orders loaded so far.
+  const loadMoreOrders = async (all = false) => {
+    let orders = reportData.orders;
+    let cursor = ordersCursor;
+    setOrdersLoading(true);
+    try {
+      while (cursor) {
+        const response = await requestReport(reportQuery, cursor);
+        orders = [...orders, ...response.data.orders.results];
+        cursor = response.data.orders.next_cursor;
+        if (!all) break;
+      }
+    } catch (err) {
+      setError(err.response?.data?.message || "Failed to fetch orders.");
+      console.error("Error fetching orders:", err);
+    } finally {
+      setReportData((prev) => ({ ...prev, orders }));
+      setOrdersCursor(cursor);
+      setOrdersLoading(false);
+    }
+    return orders;
+  };
+
   const handleLastMonth = () => {
     setMonth((prev) => (prev === 1 ? 12 : prev - 1));
     if (month === 1) {
@@ -163,13 +185,16 @@ function Reports({ apiUrl = "http://localhost:8000/api/" }) {
     setShowReport(false);
   };
 
-  const handlePrint = () => {
+  const handlePrint = async () => {
     if (!reportData) {
       setError("No report data available to export.");
       return;
     }
 
     try {
+      const orders = ordersCursor
+        ? await loadMoreOrders(true)
+        : reportData.orders;
       const workbook = XLSX.utils.book_new();
 
       // 1. Summary Sheet
@@ -232,7 +257,7 @@ function Reports({ apiUrl = "http://localhost:8000/api/" }) {
         "Total Paid (EGP)",
         "Items",
       ];
-      const ordersData = reportData.orders.map((order) => [
+      const ordersData = orders.map((order) => [
         order.order_id,
         order.original_cart_total?.toFixed(2) || "0.00",
         order.cart_total?.toFixed(2) || "0.00",
@@ -700,6 +725,15 @@ function Reports({ apiUrl = "http://localhost:8000/api/" }) {
               ))}
             </div>
           )}
+          {ordersCursor && (
+            <button
+              onClick={() => loadMoreOrders()}
+              className={styles["submit-button"]}
+              disabled={ordersLoading}
+            >
+              {ordersLoading ? "Loading..." : "Load More Orders"}
+            </button>
+          )}
 
           <h3 className={styles["section-title"]}>Sold Products Summary</h3>
           {reportData.products.length === 0 ? (
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useContext } from "react";
+import React, { useState, useEffect, useContext, useRef } from "react";
 import { Link, useNavigate } from "react-router-dom";
 import axios from "axios";
 import styles from "./Checkout.module.css";
@@ -18,6 +18,7 @@ function Checkout() {
   const [couponDiscount, setCouponDiscount] = useState(0);
   const [error, setError] = useState(null);
   const [loading, setLoading] = useState(false);
+  const orderAttempt = useRef(null);
   const navigate = useNavigate();
 
   const governorates = [
@@ -179,6 +180,13 @@ function Checkout() {
       coupon_code: couponStatus === "valid" ? couponCode : undefined,
     };
 
+    // Resubmitting the same order reuses its key, so a retry after a dropped
+    // response returns the order that was already placed instead of a second one.
+    const payload = JSON.stringify(orderData);
+    if (!orderAttempt.current || orderAttempt.current.payload !== payload) {
+      orderAttempt.current = { payload, key: newIdempotencyKey() };
+    }
+
     try {
       const response = await axios.post(
         "http://localhost:8000/api/orders/",
@@ -188,9 +196,11 @@ function Checkout() {
           headers: {
             "X-CSRFToken": getCookie("csrftoken"),
             "Content-Type": "application/json",
+            "Idempotency-Key": orderAttempt.current.key,
           },
         }
       );
+      orderAttempt.current = null;
       localStorage.removeItem("cart");
       setCart([]);
       navigate("/orders", { state: { orderData: response.data } });
@@ -223,6 +233,11 @@ function Checkout() {
     }
   };
 
+  function newIdempotencyKey() {
+    if (window.crypto?.randomUUID) return window.crypto.randomUUID();
+    return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+  }
+
   function getCookie(name) {
     let cookieValue = null;
     if (document.cookie && document.cookie !== "") {